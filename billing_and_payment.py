@@ -2,8 +2,11 @@ import csv
 import os
 from datetime import datetime
 
+import storage
+
 transactions = {}
 transaction_counter = 1000
+dirty_transactions = set()  # transaction IDs added since the last save
 discount_codes = {
     "WELCOME10": 0.10,
     "STUDENT15": 0.15,
@@ -11,53 +14,115 @@ discount_codes = {
     "SENIOR": 0.20,
 }
 
+TRANSACTION_FIELDS = [
+    "transaction_id",
+    "order_id",
+    "subtotal",
+    "service_charge",
+    "tax",
+    "discount",
+    "total",
+    "payment_type",
+    "amount_paid",
+    "change",
+    "timestamp",
+    "cashier",
+]
+
+# Transactions mirrored into one CSV file per day for date-range reports
+TRANSACTION_ARCHIVE_DIR = "transactions_by_day"
+ARCHIVE_MANIFEST = "manifest.csv"
+
 PAYMENT_TYPES = ["Cash", "Card", "E-Wallet"]
 SERVICE_CHARGE_RATE = 0.10  # 10% service charge
 TAX_RATE = 0.12  # 12% VAT
 
 
 def save_transactions_to_csv(filename="transactions.csv"):
-    """Save all transactions to CSV file"""
+    """Save transactions, writing only the ones added since the last save"""
+    try:
+        storage.save_rows(
+            filename,
+            TRANSACTION_FIELDS,
+            transactions,
+            lambda trans_id: [transaction_row(transactions[trans_id])],
+            dirty_transactions,
+        )
+        dirty_transactions.clear()
+        return True
+    except Exception as e:
+        print(f"Error saving transactions: {e}")
+        return False
+
+
+def transaction_row(trans):
+    """Transaction as a CSV row in TRANSACTION_FIELDS order"""
+    return [trans[field] for field in TRANSACTION_FIELDS]
+
+
+def archive_transaction(trans, archive_dir=TRANSACTION_ARCHIVE_DIR):
+    """
+    Append a transaction to its day partition in the archive
+
+    Each day gets its own CSV file (YYYY-MM-DD.csv) and the manifest lists
+    the days that have one, so a date-range report only opens the days in
+    range instead of the whole transaction history.
+
+    """
+    day = trans["timestamp"].split(" ")[0]
+    partition = os.path.join(archive_dir, f"{day}.csv")
+
     try:
-        with open(filename, "w", newline="") as file:
+        os.makedirs(archive_dir, exist_ok=True)
+        is_new_day = not os.path.exists(partition)
+
+        with open(partition, "a", newline="") as file:
             writer = csv.writer(file)
-            writer.writerow(
-                [
-                    "transaction_id",
-                    "order_id",
-                    "subtotal",
-                    "service_charge",
-                    "tax",
-                    "discount",
-                    "total",
-                    "payment_type",
-                    "amount_paid",
-                    "change",
-                    "timestamp",
-                    "cashier",
-                ]
-            )
+            if is_new_day:
+                writer.writerow(TRANSACTION_FIELDS)
+            writer.writerow(transaction_row(trans))
+
+        if is_new_day:
+            manifest = os.path.join(archive_dir, ARCHIVE_MANIFEST)
+            is_new_manifest = not os.path.exists(manifest)
+            with open(manifest, "a", newline="") as file:
+                writer = csv.writer(file)
+                if is_new_manifest:
+                    writer.writerow(["date", "filename"])
+                writer.writerow([day, f"{day}.csv"])
+        return True
+    except Exception as e:
+        print(f"Error archiving transaction: {e}")
+        return False
+
+
+def build_transaction_archive(archive_dir=TRANSACTION_ARCHIVE_DIR):
+    """Rebuild the day-partitioned archive from all loaded transactions"""
+    by_day = {}
+    for trans in transactions.values():
+        by_day.setdefault(trans["timestamp"].split(" ")[0], []).append(trans)
+
+    try:
+        os.makedirs(archive_dir, exist_ok=True)
+
+        for day, day_transactions in by_day.items():
+            with open(os.path.join(archive_dir, f"{day}.csv"), "w", newline="") as file:
+                writer = csv.writer(file)
+                writer.writerow(TRANSACTION_FIELDS)
+                for trans in day_transactions:
+                    writer.writerow(transaction_row(trans))
 
-            for trans_id, trans in transactions.items():
-                writer.writerow(
-                    [
-                        trans["transaction_id"],
-                        trans["order_id"],
-                        trans["subtotal"],
-                        trans["service_charge"],
-                        trans["tax"],
-                        trans["discount"],
-                        trans["total"],
-                        trans["payment_type"],
-                        trans["amount_paid"],
-                        trans["change"],
-                        trans["timestamp"],
-                        trans["cashier"],
-                    ]
-                )
+        # Manifest goes last so a half-built archive is never used
+        with open(os.path.join(archive_dir, ARCHIVE_MANIFEST), "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["date", "filename"])
+            for day in sorted(by_day):
+                writer.writerow([day, f"{day}.csv"])
+
+        print(f"Archived {len(transactions)} transactions into {len(by_day)} days")
         return True
     except Exception as e:
-        print(f"Error saving transactions: {e}")
+        print(f"Error building transaction archive: {e}")
         return False
 
 
@@ -65,38 +130,42 @@ def load_transactions_from_csv(filename="transactions.csv"):
     """Load transactions from CSV file"""
     global transactions, transaction_counter
 
-    if not os.path.exists(filename):
+    if not storage.exists(filename):
         print(f"{filename} not found. Starting fresh.")
         return False
 
     try:
-        with open(filename, "r") as file:
-            reader = csv.DictReader(file)
-            transactions = {}
-            max_trans_id = 1000
-
-            for row in reader:
-                trans_id = int(row["transaction_id"])
-                max_trans_id = max(max_trans_id, trans_id)
-
-                transactions[trans_id] = {
-                    "transaction_id": trans_id,
-                    "order_id": int(row["order_id"]),
-                    "subtotal": float(row["subtotal"]),
-                    "service_charge": float(row["service_charge"]),
-                    "tax": float(row["tax"]),
-                    "discount": float(row["discount"]),
-                    "total": float(row["total"]),
-                    "payment_type": row["payment_type"],
-                    "amount_paid": float(row["amount_paid"]),
-                    "change": float(row["change"]),
-                    "timestamp": row["timestamp"],
-                    "cashier": row["cashier"],
-                }
-
-            transaction_counter = max_trans_id + 1
+        transactions = {}
+        dirty_transactions.clear()
+        max_trans_id = 1000
+
+        for row in storage.load_rows(filename):
+            trans_id = int(row["transaction_id"])
+            max_trans_id = max(max_trans_id, trans_id)
+
+            transactions[trans_id] = {
+                "transaction_id": trans_id,
+                "order_id": int(row["order_id"]),
+                "subtotal": float(row["subtotal"]),
+                "service_charge": float(row["service_charge"]),
+                "tax": float(row["tax"]),
+                "discount": float(row["discount"]),
+                "total": float(row["total"]),
+                "payment_type": row["payment_type"],
+                "amount_paid": float(row["amount_paid"]),
+                "change": float(row["change"]),
+                "timestamp": row["timestamp"],
+                "cashier": row["cashier"],
+            }
+
+        transaction_counter = max_trans_id + 1
 
         print(f"Loaded {len(transactions)} transactions from {filename}")
+
+        # First load after upgrading: mirror existing history into the archive
+        manifest = os.path.join(TRANSACTION_ARCHIVE_DIR, ARCHIVE_MANIFEST)
+        if transactions and not os.path.exists(manifest):
+            build_transaction_archive()
         return True
     except Exception as e:
         print(f"Error loading transactions: {e}")
@@ -241,7 +310,9 @@ def process_payment(
         "cashier": cashier,
     }
 
+    dirty_transactions.add(transaction_id)
     save_transactions_to_csv()
+    archive_transaction(transactions[transaction_id])
 
     print(f"Payment processed successfully! Transaction ID: {transaction_id}")
     if payment_type == "Cash" and change > 0:
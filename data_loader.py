@@ -0,0 +1,286 @@
+"""
+Data loading for the Restaurant Management System
+Loads each module's data the first time a screen needs it, restoring from
+a binary snapshot and only re-parsing the CSV files that changed since the
+snapshot was written
+"""
+
+import os
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import storage
+import user_management as um
+import menu_management as menu
+import inventory_management as inv
+import ordering_table_management as order
+import billing_and_payment as billing
+
+SNAPSHOT_DIR = "snapshots"
+
+# Each group lists the module globals it restores, the files they come
+# from, and the (file, load function) steps that rebuild them. Steps in a
+# group run in order; separate groups load in parallel.
+DATA_GROUPS = {
+    "users": {
+        "module": um,
+        "state": ["users"],
+        "files": ["users.csv"],
+        "loaders": [("users.csv", um.load_users_from_csv)],
+    },
+    "activity_log": {
+        "module": um,
+        "state": ["user_activity_log", "activity_log_saved"],
+        "files": ["user_activity.csv"],
+        "loaders": [("user_activity.csv", um.load_activity_log_from_csv)],
+    },
+    "menu": {
+        "module": menu,
+        "state": [
+            "menu_items",
+            "item_counter",
+            "search_index",
+            "search_tokens",
+            "item_tokens",
+            "trigram_index",
+            "item_trigrams",
+            "category_items",
+            "status_items",
+            "menu_version",
+            "rendered_boards",
+        ],
+        "files": ["menu_items.csv"],
+        "loaders": [("menu_items.csv", menu.load_menu_from_csv)],
+    },
+    "inventory": {
+        "module": inv,
+        "state": [
+            "inventory",
+            "inventory_counter",
+            "lots",
+            "lot_counter",
+            "name_index",
+            "low_stock_ids",
+            "expiry_dates",
+            "expiry_index",
+            "recipes",
+        ],
+        "files": ["inventory.csv", "inventory_lots.csv", "recipes.csv"],
+        "loaders": [
+            ("inventory.csv", inv.load_inventory_from_csv),
+            ("recipes.csv", inv.load_recipes_from_csv),
+        ],
+    },
+    "orders": {
+        "module": order,
+        "state": [
+            "tables",
+            "orders",
+            "order_counter",
+            "journal_entries",
+            "dirty_tables",
+            "dirty_orders",
+            "deleted_orders",
+            "archive_offsets",
+            "status_index",
+            "customer_orders",
+            "free_tables",
+            "free_capacities",
+            "table_adjacency",
+            "table_groups",
+        ],
+        "files": [
+            "tables.csv",
+            order.TABLE_ADJACENCY_FILE,
+            "orders.csv",
+            "order_items.csv",
+            "order_ingredients.csv",
+            order.ORDER_ARCHIVE_INDEX_FILE,
+            order.ORDER_JOURNAL_FILE,
+        ],
+        "loaders": [
+            ("tables.csv", order.load_tables_from_csv),
+            ("orders.csv", order.load_orders_from_csv),
+            ("order_items.csv", order.load_order_items_from_csv),
+            ("order_ingredients.csv", order.load_order_ingredients_from_csv),
+            (order.ORDER_ARCHIVE_INDEX_FILE, order.load_order_archive_index),
+            (order.ORDER_JOURNAL_FILE, order.replay_order_journal),
+        ],
+    },
+    "billing": {
+        "module": billing,
+        "state": ["transactions", "transaction_counter"],
+        "files": ["transactions.csv"],
+        "loaders": [("transactions.csv", billing.load_transactions_from_csv)],
+    },
+}
+
+# Groups needed before anyone logs in
+STARTUP_GROUPS = ["users"]
+
+LOAD_WORKERS = 4
+
+loaded_groups = set()
+load_times = {}  # file (or "<group> snapshot") -> seconds spent loading it
+snapshot_sources = {}  # group -> source stamps its current snapshot matches
+
+
+def snapshot_path(group):
+    return os.path.join(SNAPSHOT_DIR, f"{group}.pkl")
+
+
+def source_stamps(group):
+    """Modification time and size of every file a group is loaded from"""
+    stamps = {}
+    for filename in DATA_GROUPS[group]["files"]:
+        if filename.endswith(".csv"):
+            filename = storage.source_file(filename)
+        if os.path.exists(filename):
+            info = os.stat(filename)
+            stamps[filename] = (info.st_mtime_ns, info.st_size)
+        else:
+            stamps[filename] = None
+    return stamps
+
+
+def save_snapshot(group):
+    """Write the in-memory state of one group to its binary snapshot"""
+    sources = source_stamps(group)
+    if snapshot_sources.get(group) == sources:
+        return True  # nothing was saved since the snapshot was taken
+
+    module = DATA_GROUPS[group]["module"]
+    snapshot = {
+        "backend": storage.backend,
+        "sources": sources,
+        "state": {
+            name: getattr(module, name) for name in DATA_GROUPS[group]["state"]
+        },
+    }
+
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        temp_path = snapshot_path(group) + ".tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, snapshot_path(group))
+        snapshot_sources[group] = sources
+        return True
+    except Exception as e:
+        print(f"Error saving {group} snapshot: {e}")
+        return False
+
+
+def load_snapshot(group):
+    """
+    Restore one group from its snapshot
+
+    Returns:
+        True if restored, False if the snapshot is missing or out of date
+    """
+    path = snapshot_path(group)
+    if not os.path.exists(path):
+        return False
+
+    try:
+        with open(path, "rb") as file:
+            snapshot = pickle.load(file)
+    except Exception as e:
+        print(f"Ignoring unreadable {group} snapshot: {e}")
+        return False
+
+    # Any change to the source files since the snapshot means re-parsing them
+    if snapshot["backend"] != storage.backend:
+        return False
+    if snapshot["sources"] != source_stamps(group):
+        return False
+
+    module = DATA_GROUPS[group]["module"]
+    for name, value in snapshot["state"].items():
+        setattr(module, name, value)
+
+    # Formatted rows cached from before the restore no longer apply
+    for filename in DATA_GROUPS[group]["files"]:
+        storage.row_cache.pop(filename, None)
+
+    snapshot_sources[group] = snapshot["sources"]
+    print(f"Restored {group} from snapshot")
+    return True
+
+
+def load_group(group):
+    """Load one group, from its snapshot when it is still current"""
+    start_time = time.perf_counter()
+    if load_snapshot(group):
+        load_times[f"{group} snapshot"] = time.perf_counter() - start_time
+    else:
+        for filename, loader in DATA_GROUPS[group]["loaders"]:
+            start_time = time.perf_counter()
+            loader()
+            load_times[filename] = time.perf_counter() - start_time
+
+    loaded_groups.add(group)
+
+
+def require(*groups):
+    """
+    Make sure the given groups are loaded, loading each one on first use
+
+    Logs are only appended to, so they can be written before they are
+    loaded. Every other group must be required before it is changed.
+    The inventory usage log is never loaded; it is read from its tail.
+    """
+    missing = [group for group in groups if group not in loaded_groups]
+
+    if len(missing) <= 1:
+        for group in missing:
+            load_group(group)
+        return
+
+    # Groups touch different files and globals, so they can load side by side
+    with ThreadPoolExecutor(max_workers=min(LOAD_WORKERS, len(missing))) as pool:
+        list(pool.map(load_group, missing))
+
+
+def load_startup():
+    """Load only what the login screen needs"""
+    require(*STARTUP_GROUPS)
+
+
+def load_all():
+    """Load every group"""
+    require(*DATA_GROUPS)
+
+
+def display_load_times():
+    """Display how long each file (or snapshot) took to load"""
+    print("\nDATA LOAD TIMES")
+    print("=" * 50)
+    print(f"{'Source':<30} {'ms':<10}")
+    print("=" * 50)
+
+    if not load_times:
+        print("Nothing loaded yet.")
+    else:
+        for source, seconds in sorted(load_times.items(), key=lambda t: -t[1]):
+            print(f"{source:<30} {seconds * 1000:<10.2f}")
+
+    print("=" * 50)
+
+
+def save_snapshots():
+    """Snapshot every group that is currently loaded"""
+    for group in loaded_groups:
+        save_snapshot(group)
+
+
+def shutdown():
+    """Flush buffered logs, fold the order journal into the CSV files and
+    refresh snapshots"""
+    inv.save_usage_log_to_csv()
+
+    # Compacting without the orders loaded would overwrite them with nothing
+    if "orders" in loaded_groups:
+        order.compact_order_journal()
+    save_snapshots()
@@ -1,142 +1,416 @@
-import csv
-import os
-from datetime import datetime, timedelta
+import heapq
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+
+import storage
+
+try:
+    import numpy as np
+except ImportError:  # forecasting is optional
+    np = None
 
 inventory = {}
 inventory_counter = 1
-usage_log = []
+usage_log = []  # usage entries not yet appended to inventory_usage.csv
+dirty_items = set()  # item IDs changed since the last save
+lots = {}  # item ID -> heap of [expiry sort date, lot ID, quantity, expiration date]
+lot_counter = 1
+name_index = {}  # lowercase item name -> item ID
+low_stock_ids = set()  # item IDs at or below their reorder level
+expiry_dates = {}  # item ID -> parsed expiration date
+expiry_index = []  # (expiration date, item ID), kept sorted
+recipes = {}  # menu item ID -> {inventory item ID: quantity per serving}
+dirty_recipes = set()  # menu item IDs whose recipe changed since the last save
+deleted_recipes = set()  # menu item IDs whose recipe was removed since the last save
 
 UNITS = ["kg", "g", "L", "ml", "pcs", "packs"]
 
+USAGE_LOG_FIELDS = ["timestamp", "item_name", "quantity_used", "reason", "remaining"]
+USAGE_LOG_BATCH_SIZE = 1  # entries buffered before one group append (1 = immediate)
+RENAME_REASON = "Renamed from "  # usage log reason prefix, followed by the old name
+
+FORECAST_WINDOW_DAYS = 30  # trailing days used for the daily consumption rate
+FORECAST_COVER_DAYS = 14  # days of consumption a suggested reorder should cover
+
 
 def save_inventory_to_csv(filename="inventory.csv"):
-    """Save all inventory items to CSV file"""
+    """Save inventory items, writing only the ones changed since the last save"""
     try:
-        with open(filename, "w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(
+        storage.save_rows(
+            filename,
+            [
+                "item_id",
+                "item_name",
+                "quantity",
+                "unit",
+                "supplier",
+                "expiration_date",
+                "reorder_level",
+                "last_updated",
+            ],
+            inventory,
+            lambda item_id: [
                 [
-                    "item_id",
-                    "item_name",
-                    "quantity",
-                    "unit",
-                    "supplier",
-                    "expiration_date",
-                    "reorder_level",
-                    "last_updated",
+                    inventory[item_id]["item_id"],
+                    inventory[item_id]["item_name"],
+                    inventory[item_id]["quantity"],
+                    inventory[item_id]["unit"],
+                    inventory[item_id]["supplier"],
+                    inventory[item_id]["expiration_date"],
+                    inventory[item_id]["reorder_level"],
+                    inventory[item_id]["last_updated"],
                 ]
-            )
+            ],
+            dirty_items,
+        )
+        save_lots_to_csv()
+        dirty_items.clear()
+        return True
+    except Exception as e:
+        print(f"Error saving inventory: {e}")
+        return False
+
+
+def save_lots_to_csv(filename="inventory_lots.csv"):
+    """Save the stock lots of every item changed since the last save"""
+    storage.save_rows(
+        filename,
+        ["lot_id", "item_id", "quantity", "expiration_date"],
+        inventory,
+        lambda item_id: [
+            [lot[1], item_id, lot[2], lot[3]] for lot in sorted(lots.get(item_id, []))
+        ],
+        dirty_items,
+    )
 
-            for item_id, item in inventory.items():
-                writer.writerow(
+
+def load_lots_from_csv(filename="inventory_lots.csv"):
+    """
+    Load stock lots from CSV file
+
+    Stock not covered by any lot (inventory saved before lots existed)
+    becomes one lot carrying the item's expiration date.
+    """
+    global lots, lot_counter
+
+    try:
+        lots = {}
+        max_lot_id = 0
+
+        for row in storage.load_rows(filename) or []:
+            lot_id = int(row["lot_id"])
+            item_id = int(row["item_id"])
+            max_lot_id = max(max_lot_id, lot_id)
+
+            if item_id in inventory:
+                exp_date = parse_expiration_date(row["expiration_date"])
+                lots.setdefault(item_id, []).append(
                     [
-                        item["item_id"],
-                        item["item_name"],
-                        item["quantity"],
-                        item["unit"],
-                        item["supplier"],
-                        item["expiration_date"],
-                        item["reorder_level"],
-                        item["last_updated"],
+                        exp_date or date.max,
+                        lot_id,
+                        float(row["quantity"]),
+                        row["expiration_date"] if exp_date else "N/A",
                     ]
                 )
+
+        for heap in lots.values():
+            heapq.heapify(heap)
+        lot_counter = max_lot_id + 1
+
+        for item_id, item in inventory.items():
+            missing = item["quantity"] - sum(lot[2] for lot in lots.get(item_id, []))
+            if missing > 1e-9:
+                add_lot(item_id, missing, item["expiration_date"])
+                dirty_items.add(item_id)
+            if refresh_expiration(item_id):
+                dirty_items.add(item_id)
+
+        if dirty_items:
+            save_inventory_to_csv()
+
+        print(f"Loaded {sum(len(heap) for heap in lots.values())} stock lots")
         return True
     except Exception as e:
-        print(f"Error saving inventory: {e}")
+        print(f"Error loading stock lots: {e}")
         return False
 
 
 def load_inventory_from_csv(filename="inventory.csv"):
     """Load inventory items from CSV file"""
-    global inventory, inventory_counter
+    global inventory, inventory_counter, name_index, low_stock_ids
+    global expiry_dates, expiry_index
 
-    if not os.path.exists(filename):
+    if not storage.exists(filename):
         print(f"{filename} not found. Starting with empty inventory.")
         return False
 
     try:
-        with open(filename, "r") as file:
-            reader = csv.DictReader(file)
-            inventory = {}
-            max_item_id = 0
-
-            for row in reader:
-                item_id = int(row["item_id"])
-                max_item_id = max(max_item_id, item_id)
-
-                inventory[item_id] = {
-                    "item_id": item_id,
-                    "item_name": row["item_name"],
-                    "quantity": float(row["quantity"]),
-                    "unit": row["unit"],
-                    "supplier": row["supplier"],
-                    "expiration_date": row["expiration_date"],
-                    "reorder_level": float(row["reorder_level"]),
-                    "last_updated": row["last_updated"],
-                }
-
-            inventory_counter = max_item_id + 1
+        inventory = {}
+        name_index = {}
+        low_stock_ids = set()
+        expiry_dates = {}
+        expiry_index = []
+        dirty_items.clear()
+        max_item_id = 0
+
+        for row in storage.load_rows(filename):
+            item_id = int(row["item_id"])
+            max_item_id = max(max_item_id, item_id)
+
+            inventory[item_id] = {
+                "item_id": item_id,
+                "item_name": row["item_name"],
+                "quantity": float(row["quantity"]),
+                "unit": row["unit"],
+                "supplier": row["supplier"],
+                "expiration_date": row["expiration_date"],
+                "reorder_level": float(row["reorder_level"]),
+                "last_updated": row["last_updated"],
+            }
+            name_index[row["item_name"].lower()] = item_id
+            update_low_stock(item_id)
+
+            exp_date = parse_expiration_date(row["expiration_date"])
+            if exp_date is not None:
+                expiry_dates[item_id] = exp_date
+                expiry_index.append((exp_date, item_id))
+
+        expiry_index.sort()
+        inventory_counter = max_item_id + 1
 
         print(f"Loaded {len(inventory)} inventory items from {filename}")
-        return True
+        return load_lots_from_csv()
     except Exception as e:
         print(f"Error loading inventory: {e}")
         return False
 
 
 def save_usage_log_to_csv(filename="inventory_usage.csv"):
-    """Save inventory usage log to CSV"""
-    try:
-        with open(filename, "w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(
-                ["timestamp", "item_name", "quantity_used", "reason", "remaining"]
-            )
+    """Append buffered usage entries to the usage log file"""
+    global usage_log
 
-            for log in usage_log:
-                writer.writerow(
-                    [
-                        log["timestamp"],
-                        log["item_name"],
-                        log["quantity_used"],
-                        log["reason"],
-                        log["remaining"],
-                    ]
-                )
+    if not usage_log:
+        return True
+
+    try:
+        storage.append_rows(
+            filename,
+            USAGE_LOG_FIELDS,
+            [[log[field] for field in USAGE_LOG_FIELDS] for log in usage_log],
+        )
+        usage_log = []
         return True
     except Exception as e:
         print(f"Error saving usage log: {e}")
         return False
 
 
-def load_usage_log_from_csv(filename="inventory_usage.csv"):
-    """Load usage log from CSV"""
-    global usage_log
+def read_usage_log(limit=None, filename="inventory_usage.csv"):
+    """
+    Read usage log entries from storage
+
+    Args:
+        limit: Only read this many of the most recent entries (None = all)
+        filename: Path to the usage log
+
+    """
+    save_usage_log_to_csv(filename)
+
+    if limit is None:
+        rows = storage.load_rows(filename) or []
+    else:
+        rows = storage.tail_rows(filename, limit)
+
+    return [
+        {
+            "timestamp": row["timestamp"],
+            "item_name": row["item_name"],
+            "quantity_used": float(row["quantity_used"]),
+            "reason": row["reason"],
+            "remaining": float(row["remaining"]),
+        }
+        for row in rows
+    ]
+
+
+def save_recipes_to_csv(filename="recipes.csv"):
+    """Save recipes, writing only the ones changed since the last save"""
+    try:
+        storage.save_rows(
+            filename,
+            ["menu_item_id", "ingredient_id", "quantity"],
+            recipes,
+            lambda menu_item_id: [
+                [menu_item_id, ingredient_id, quantity]
+                for ingredient_id, quantity in recipes[menu_item_id].items()
+            ],
+            dirty_recipes,
+            deleted_recipes,
+        )
+        dirty_recipes.clear()
+        deleted_recipes.clear()
+        return True
+    except Exception as e:
+        print(f"Error saving recipes: {e}")
+        return False
+
 
-    if not os.path.exists(filename):
+def load_recipes_from_csv(filename="recipes.csv"):
+    """Load recipes from CSV file"""
+    global recipes
+
+    if not storage.exists(filename):
+        print(f"{filename} not found. Starting with no recipes.")
         return False
 
     try:
-        with open(filename, "r") as file:
-            reader = csv.DictReader(file)
-            usage_log = []
-
-            for row in reader:
-                usage_log.append(
-                    {
-                        "timestamp": row["timestamp"],
-                        "item_name": row["item_name"],
-                        "quantity_used": float(row["quantity_used"]),
-                        "reason": row["reason"],
-                        "remaining": float(row["remaining"]),
-                    }
-                )
+        recipes = {}
+        dirty_recipes.clear()
+        deleted_recipes.clear()
 
+        for row in storage.load_rows(filename):
+            recipe = recipes.setdefault(int(row["menu_item_id"]), {})
+            recipe[int(row["ingredient_id"])] = float(row["quantity"])
+
+        print(f"Loaded {len(recipes)} recipes from {filename}")
         return True
     except Exception as e:
-        print(f"Error loading usage log: {e}")
+        print(f"Error loading recipes: {e}")
+        return False
+
+
+def find_item_id(item_name):
+    """
+    Look up an item ID by name (case-insensitive)
+
+    Args:
+        item_name: Name of the item
+
+    Returns:
+        Item ID or None if not found
+    """
+    return name_index.get(item_name.lower())
+
+
+def update_low_stock(item_id):
+    """Add or remove an item from the low-stock set after it changes"""
+    item = inventory[item_id]
+    if item["quantity"] <= item["reorder_level"]:
+        low_stock_ids.add(item_id)
+    else:
+        low_stock_ids.discard(item_id)
+
+
+def parse_expiration_date(value):
+    """Parse a YYYY-MM-DD expiration date, or None for 'N/A' and bad dates"""
+    if not value or value == "N/A":
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def update_expiry_index(item_id):
+    """Re-file an item in the expiry index after its expiration date changes"""
+    old_date = expiry_dates.pop(item_id, None)
+    if old_date is not None:
+        del expiry_index[bisect_left(expiry_index, (old_date, item_id))]
+
+    item = inventory.get(item_id)
+    new_date = parse_expiration_date(item["expiration_date"]) if item else None
+    if new_date is not None:
+        expiry_dates[item_id] = new_date
+        insort(expiry_index, (new_date, item_id))
+
+
+def add_lot(item_id, quantity, expiration_date):
+    """Receive a new lot of an item"""
+    global lot_counter
+
+    exp_date = parse_expiration_date(expiration_date)
+    heapq.heappush(
+        lots.setdefault(item_id, []),
+        [
+            exp_date or date.max,
+            lot_counter,
+            quantity,
+            expiration_date if exp_date else "N/A",
+        ],
+    )
+    lot_counter += 1
+
+
+def consume_lots(item_id, quantity):
+    """
+    Take quantity from an item's lots, earliest expiry (then oldest) first
+
+    Returns:
+        List of (quantity, expiration date) taken from each lot
+    """
+    heap = lots.get(item_id, [])
+    taken = []
+    while quantity > 1e-9 and heap:
+        lot = heap[0]
+        if lot[2] <= quantity + 1e-9:
+            quantity -= lot[2]
+            taken.append((lot[2], lot[3]))
+            heapq.heappop(heap)
+        else:
+            lot[2] -= quantity
+            taken.append((quantity, lot[3]))
+            quantity = 0
+
+    # Stock not covered by any lot has no expiry
+    if quantity > 1e-9:
+        taken.append((quantity, "N/A"))
+    return taken
+
+
+def refresh_expiration(item_id):
+    """
+    Set an item's expiration date to that of its next lot to be used
+
+    Returns:
+        True if the date changed
+    """
+    heap = lots.get(item_id)
+    item = inventory[item_id]
+    expiration_date = heap[0][3] if heap else "N/A"
+
+    if item["expiration_date"] == expiration_date:
         return False
 
+    item["expiration_date"] = expiration_date
+    update_expiry_index(item_id)
+    return True
+
+
+def adjust_lots(item_id, quantity_change, expiration_date=None):
+    """Add a lot for incoming stock or consume lots for outgoing stock"""
+    if quantity_change > 0:
+        add_lot(item_id, quantity_change, expiration_date or "N/A")
+    elif quantity_change < 0:
+        consume_lots(item_id, -quantity_change)
+    refresh_expiration(item_id)
+
+
+def get_lots(item_name):
+    """
+    Get the stock lots of an item in the order they will be used
+
+    Args:
+        item_name: Name of the item
+
+    """
+    item_id = find_item_id(item_name)
+    if item_id is None:
+        return []
+    return [
+        {"lot_id": lot[1], "quantity": lot[2], "expiration_date": lot[3]}
+        for lot in sorted(lots.get(item_id, []))
+    ]
+
 
 def add_stock(
     item_name, quantity, unit, supplier, expiration_date=None, reorder_level=10
@@ -167,10 +441,9 @@ def add_stock(
         print("Quantity cannot be negative")
         return None
 
-    for item_id, item in inventory.items():
-        if item["item_name"].lower() == item_name.lower():
-            print(f"Item '{item_name}' already exists. Use update_stock() instead.")
-            return None
+    if find_item_id(item_name) is not None:
+        print(f"Item '{item_name}' already exists. Use update_stock() instead.")
+        return None
 
     item_id = inventory_counter
     inventory_counter += 1
@@ -185,31 +458,37 @@ def add_stock(
         "reorder_level": reorder_level,
         "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
     }
+    name_index[item_name.lower()] = item_id
+    update_low_stock(item_id)
+    update_expiry_index(item_id)
+    if quantity > 0:
+        add_lot(item_id, quantity, expiration_date or "N/A")
 
+    dirty_items.add(item_id)
     save_inventory_to_csv()
     print(f"Inventory item '{item_name}' added successfully! (ID: {item_id})")
     return item_id
 
 
-def update_stock(item_name, quantity_change, reason="Manual adjustment"):
+def update_stock(
+    item_name, quantity_change, reason="Manual adjustment", expiration_date=None
+):
     """
     Update stock quantity (add or deduct)
 
+    Added stock becomes a new lot; deducted stock is taken from the lot
+    that expires first.
+
     Args:
         item_name: Name of the item
         quantity_change: Amount to add (positive) or deduct (negative)
         reason: Reason for the change
+        expiration_date: Expiration date (YYYY-MM-DD) of added stock, or None
 
     """
     global inventory
 
-    # Find item by name
-    item_id = None
-    for id, item in inventory.items():
-        if item["item_name"].lower() == item_name.lower():
-            item_id = id
-            break
-
+    item_id = find_item_id(item_name)
     if item_id is None:
         print(f"Item '{item_name}' not found in inventory")
         return False
@@ -225,18 +504,20 @@ def update_stock(item_name, quantity_change, reason="Manual adjustment"):
 
     item["quantity"] = new_quantity
     item["last_updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    update_low_stock(item_id)
+    adjust_lots(item_id, quantity_change, expiration_date)
 
     log_usage(item_name, abs(quantity_change), reason, new_quantity)
 
+    dirty_items.add(item_id)
     save_inventory_to_csv()
-    save_usage_log_to_csv()
 
     action = "Added" if quantity_change > 0 else "Deducted"
     print(
         f"{action} {abs(quantity_change)} {item['unit']} of '{item_name}'. New quantity: {new_quantity} {item['unit']}"
     )
 
-    if new_quantity <= item["reorder_level"]:
+    if item_id in low_stock_ids:
         print(f"LOW STOCK ALERT: '{item_name}' is at or below reorder level!")
 
     return True
@@ -255,7 +536,9 @@ def deduct_stock(item_name, quantity_used, reason="Order processed"):
     return update_stock(item_name, -quantity_used, reason)
 
 
-def add_to_stock(item_name, quantity_added, reason="Stock replenishment"):
+def add_to_stock(
+    item_name, quantity_added, reason="Stock replenishment", expiration_date=None
+):
     """
     Add to existing stock (wrapper for update_stock with positive value)
 
@@ -263,23 +546,23 @@ def add_to_stock(item_name, quantity_added, reason="Stock replenishment"):
         item_name: Name of the item
         quantity_added: Amount to add
         reason: Reason for addition
+        expiration_date: Expiration date (YYYY-MM-DD) of the new lot, or None
 
     """
-    return update_stock(item_name, quantity_added, reason)
+    return update_stock(item_name, quantity_added, reason, expiration_date)
 
 
 def check_reorder_level():
     """
-    Check all items and return those at or below reorder level
+    Return the items at or below reorder level
 
     """
-    low_stock = {}
+    return {item_id: inventory[item_id] for item_id in sorted(low_stock_ids)}
 
-    for item_id, item in inventory.items():
-        if item["quantity"] <= item["reorder_level"]:
-            low_stock[item_id] = item
 
-    return low_stock
+def low_stock_count():
+    """Number of items at or below reorder level"""
+    return len(low_stock_ids)
 
 
 def get_stock_quantity(item_name):
@@ -290,10 +573,10 @@ def get_stock_quantity(item_name):
         item_name: Name of the item
 
     """
-    for item in inventory.values():
-        if item["item_name"].lower() == item_name.lower():
-            return item["quantity"]
-    return None
+    item_id = find_item_id(item_name)
+    if item_id is None:
+        return None
+    return inventory[item_id]["quantity"]
 
 
 def set_reorder_level(item_name, new_level):
@@ -305,46 +588,387 @@ def set_reorder_level(item_name, new_level):
         new_level: New reorder level
 
     """
-    for item in inventory.values():
-        if item["item_name"].lower() == item_name.lower():
-            item["reorder_level"] = new_level
-            save_inventory_to_csv()
-            print(f"Reorder level for '{item_name}' set to {new_level} {item['unit']}")
-            return True
+    item_id = find_item_id(item_name)
+    if item_id is None:
+        print(f"Item '{item_name}' not found")
+        return False
+
+    item = inventory[item_id]
+    item["reorder_level"] = new_level
+    update_low_stock(item_id)
+    dirty_items.add(item_id)
+    save_inventory_to_csv()
+    print(f"Reorder level for '{item_name}' set to {new_level} {item['unit']}")
+    return True
+
+
+def rename_stock_item(item_name, new_name):
+    """
+    Rename an inventory item
+
+    Args:
+        item_name: Current name of the item
+        new_name: New name
 
-    print(f"Item '{item_name}' not found")
-    return False
+    """
+    item_id = find_item_id(item_name)
+    if item_id is None:
+        print(f"Item '{item_name}' not found")
+        return False
+
+    if not new_name:
+        print("Item name is required")
+        return False
+
+    existing_id = find_item_id(new_name)
+    if existing_id is not None and existing_id != item_id:
+        print(f"Item '{new_name}' already exists")
+        return False
+
+    item = inventory[item_id]
+    old_name = item["item_name"]
+    del name_index[old_name.lower()]
+    item["item_name"] = new_name
+    item["last_updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    name_index[new_name.lower()] = item_id
+
+    dirty_items.add(item_id)
+    save_inventory_to_csv()
+
+    # Logged so the usage history under the old name stays with the item
+    log_usage(new_name, 0, f"{RENAME_REASON}{old_name}", item["quantity"])
+    print(f"Item '{item_name}' renamed to '{new_name}'")
+    return True
+
+
+def items_expiring_between(start_date, end_date):
+    """Items whose expiration date is on or after start_date and before end_date"""
+    low = bisect_left(expiry_index, (start_date,))
+    high = bisect_left(expiry_index, (end_date,))
+    return {item_id: inventory[item_id] for _, item_id in expiry_index[low:high]}
 
 
 def check_expiring_soon(days=7):
-    expiring = {}
-    today = datetime.now()
-    check_date = today + timedelta(days=days)
+    """
+    Return items expiring between today and the given number of days ahead
 
-    for item_id, item in inventory.items():
-        if item["expiration_date"] != "N/A":
-            try:
-                exp_date = datetime.strptime(item["expiration_date"], "%Y-%m-%d")
-                if today <= exp_date <= check_date:
-                    expiring[item_id] = item
-            except ValueError:
-                pass
+    Args:
+        days: Days ahead to check
+
+    """
+    today = datetime.now().date()
+    return items_expiring_between(today, today + timedelta(days=days + 1))
+
+
+def check_expired():
+    """Return items whose expiration date has already passed"""
+    if not expiry_index:
+        return {}
+    return items_expiring_between(expiry_index[0][0], datetime.now().date())
+
+
+def set_recipe_ingredient(menu_item_id, item_name, quantity):
+    """
+    Set how much of an ingredient one serving of a menu item uses
+
+    Args:
+        menu_item_id: ID of the menu item
+        item_name: Name of the inventory item
+        quantity: Quantity per serving (0 removes the ingredient)
+
+    """
+    item_id = find_item_id(item_name)
+    if item_id is None:
+        print(f"Item '{item_name}' not found in inventory")
+        return False
+
+    if quantity < 0:
+        print("Quantity cannot be negative")
+        return False
+
+    recipe = recipes.setdefault(menu_item_id, {})
+    if quantity == 0:
+        recipe.pop(item_id, None)
+    else:
+        recipe[item_id] = quantity
+
+    if recipe:
+        deleted_recipes.discard(menu_item_id)
+        dirty_recipes.add(menu_item_id)
+    else:
+        del recipes[menu_item_id]
+        dirty_recipes.discard(menu_item_id)
+        deleted_recipes.add(menu_item_id)
+
+    save_recipes_to_csv()
+    print(f"Recipe for menu item {menu_item_id} updated")
+    return True
+
+
+def get_recipe(menu_item_id):
+    """Ingredients of a menu item as {item name: quantity per serving}"""
+    return {
+        inventory[item_id]["item_name"]: quantity
+        for item_id, quantity in recipes.get(menu_item_id, {}).items()
+        if item_id in inventory
+    }
+
+
+def ingredient_demand(order_items):
+    """
+    Total ingredient quantities needed for a list of order items
+
+    Args:
+        order_items: List of dictionaries with item_id and quantity
+
+    Returns:
+        Dictionary of inventory item ID -> total quantity, merged across lines
+    """
+    demand = {}
+    for order_item in order_items:
+        recipe = recipes.get(order_item["item_id"])
+        if not recipe:
+            continue
+        for item_id, quantity in recipe.items():
+            demand[item_id] = demand.get(item_id, 0) + quantity * order_item["quantity"]
+    return demand
+
+
+def update_stock_batch(entries, taken=None):
+    """
+    Apply many stock changes as one transaction
+
+    Every entry is checked before anything changes; if any of them would
+    fail, none are applied. Inventory and the usage log are each saved once.
+
+    Args:
+        entries: List of (item name or ID, quantity change, reason) tuples,
+            optionally with the expiration date of added stock as a fourth value
+        taken: Optional list that receives a dictionary of item_id, quantity
+            and expiration_date for each part of a lot that was deducted
 
-    return expiring
+    """
+    changes = []
+    totals = {}
+    errors = []
+
+    for entry in entries:
+        item, quantity_change, reason = entry[:3]
+        expiration_date = entry[3] if len(entry) > 3 else None
+        item_id = item if isinstance(item, int) else find_item_id(item)
+        if item_id not in inventory:
+            errors.append(f"item '{item}' not found")
+            continue
+        changes.append((item_id, quantity_change, reason, expiration_date))
+        totals[item_id] = totals.get(item_id, 0) + quantity_change
+
+    # Several entries for the same item must fit its stock together
+    for item_id, total in totals.items():
+        item = inventory[item_id]
+        if item["quantity"] + total < 0:
+            errors.append(
+                f"cannot deduct {-total} {item['unit']} of '{item['item_name']}' "
+                f"(only {item['quantity']} {item['unit']} available)"
+            )
+
+    if errors:
+        print(f"Stock update rejected: {'; '.join(errors)}")
+        return False
+
+    # Receive new lots before consuming, so deductions can draw on them
+    for item_id, quantity_change, reason, expiration_date in changes:
+        if quantity_change > 0:
+            add_lot(item_id, quantity_change, expiration_date or "N/A")
+    for item_id, quantity_change, reason, expiration_date in changes:
+        if quantity_change < 0:
+            for quantity, lot_expiration in consume_lots(item_id, -quantity_change):
+                if taken is not None:
+                    taken.append(
+                        {
+                            "item_id": item_id,
+                            "quantity": quantity,
+                            "expiration_date": lot_expiration,
+                        }
+                    )
+
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for item_id, quantity_change, reason, expiration_date in changes:
+        item = inventory[item_id]
+        item["quantity"] += quantity_change
+        item["last_updated"] = now
+        usage_log.append(
+            usage_entry(
+                item["item_name"], abs(quantity_change), reason, item["quantity"]
+            )
+        )
+
+    for item_id in totals:
+        update_low_stock(item_id)
+        refresh_expiration(item_id)
+        dirty_items.add(item_id)
+
+    save_inventory_to_csv()
+    save_usage_log_to_csv()
+    print(f"Applied {len(changes)} stock changes to {len(totals)} items")
+
+    for item_id in totals:
+        if item_id in low_stock_ids:
+            print(
+                f"LOW STOCK ALERT: '{inventory[item_id]['item_name']}' is at or below reorder level!"
+            )
+    return True
+
+
+def deduct_ingredients(demand, reason="Order processed", taken=None):
+    """
+    Deduct the ingredients of an order in one stock transaction
+
+    Args:
+        demand: Dictionary of inventory item ID -> quantity needed
+        reason: Reason for deduction
+        taken: Optional list that receives the lot parts deducted
+            (see update_stock_batch)
+
+    """
+    return update_stock_batch(
+        [(item_id, -quantity, reason) for item_id, quantity in demand.items()], taken
+    )
+
+
+def return_ingredients(taken, reason="Order cancelled"):
+    """
+    Put deducted ingredients back with the expiry dates of their lots
+
+    Args:
+        taken: Lot parts as filled in by update_stock_batch
+        reason: Reason for the return
+
+    """
+    entries = [
+        (part["item_id"], part["quantity"], reason, part["expiration_date"])
+        for part in taken
+        if part["item_id"] in inventory
+    ]
+    if not entries:
+        return True
+    return update_stock_batch(entries)
+
+
+def usage_entry(item_name, quantity_used, reason, remaining):
+    return {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "item_name": item_name,
+        "quantity_used": quantity_used,
+        "reason": reason,
+        "remaining": remaining,
+    }
 
 
 def log_usage(item_name, quantity_used, reason, remaining):
-    global usage_log
+    """Buffer a usage entry and append the buffer once it is full"""
+    usage_log.append(usage_entry(item_name, quantity_used, reason, remaining))
 
-    usage_log.append(
-        {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "item_name": item_name,
-            "quantity_used": quantity_used,
-            "reason": reason,
-            "remaining": remaining,
+    if len(usage_log) >= USAGE_LOG_BATCH_SIZE:
+        save_usage_log_to_csv()
+
+
+def forecast_consumption(
+    window_days=FORECAST_WINDOW_DAYS,
+    cover_days=FORECAST_COVER_DAYS,
+    filename="inventory_usage.csv",
+):
+    """
+    Forecast consumption of every item from the usage log
+
+    Consumption is the drop in 'remaining' between consecutive log entries
+    of the same item, so deliveries are not counted as usage. The log is
+    read backwards from its end, stopping once every item in the window has
+    an earlier entry to diff against (or one more window has been read),
+    and the entries are processed as NumPy arrays in one pass. Entries
+    logged under an item's old names count towards it after a rename.
+
+    An item with no entry in that extra window has nothing to diff its
+    first entry in the window against, so that first drop is not counted.
+
+    Args:
+        window_days: Trailing days used for the daily consumption rate
+        cover_days: Days of consumption a suggested reorder should cover
+        filename: Path to the usage log
+
+    Returns:
+        Dictionary of item ID -> {'daily_rate', 'days_to_stockout',
+        'suggested_reorder'}, or None if NumPy is not installed
+    """
+    if np is None:
+        print("Consumption forecast unavailable (NumPy is not installed)")
+        return None
+
+    save_usage_log_to_csv(filename)
+
+    today = datetime.now().date()
+    start = str(today - timedelta(days=window_days))
+    lookback = str(today - timedelta(days=2 * window_days))
+
+    rows = []
+    names = []
+    waiting = set()
+    current_names = {}  # old name -> current name, for renames read so far
+    for row in storage.read_rows_backwards(filename):
+        day = row["timestamp"][:10]
+        name = row["item_name"].lower()
+        name = current_names.get(name, name)
+        if row["reason"].startswith(RENAME_REASON):
+            current_names[row["reason"][len(RENAME_REASON) :].lower()] = name
+
+        if day > start:
+            waiting.add(name)
+        elif day <= lookback or not waiting:
+            break
+        elif name in waiting:
+            waiting.discard(name)
+        else:
+            continue
+        rows.append(row)
+        names.append(name)
+    rows.reverse()
+    names.reverse()
+
+    forecast = {}
+
+    if rows:
+        names = np.array(names)
+        days = np.array([row["timestamp"][:10] for row in rows], dtype="datetime64[D]")
+        remaining = np.array([row["remaining"] for row in rows], dtype=float)
+
+        # Group entries by item, keeping log order within each item
+        item_names, codes = np.unique(names, return_inverse=True)
+        order = np.lexsort((np.arange(len(rows)), codes))
+        codes = codes[order]
+        days = days[order]
+        remaining = remaining[order]
+
+        same_item = codes[1:] == codes[:-1]
+        used = np.where(same_item, np.maximum(remaining[:-1] - remaining[1:], 0), 0)
+
+        recent = days[1:] > np.datetime64(start, "D")
+        totals = np.bincount(
+            codes[1:][recent], weights=used[recent], minlength=len(item_names)
+        )
+        rates = dict(zip(item_names.tolist(), (totals / window_days).tolist()))
+    else:
+        rates = {}
+
+    for item_id, item in inventory.items():
+        rate = rates.get(item["item_name"].lower(), 0.0)
+        forecast[item_id] = {
+            "daily_rate": rate,
+            "days_to_stockout": item["quantity"] / rate if rate > 0 else None,
+            "suggested_reorder": max(
+                rate * cover_days + item["reorder_level"] - item["quantity"], 0
+            ),
         }
-    )
+
+    return forecast
 
 
 def generate_inventory_report():
@@ -369,6 +993,31 @@ def generate_inventory_report():
         for item in expiring.values():
             print(f"  - {item['item_name']}: Expires {item['expiration_date']}")
 
+    expired = check_expired()
+    print(f"\nExpired Items: {len(expired)}")
+    if expired:
+        for item in expired.values():
+            print(f"  - {item['item_name']}: Expired {item['expiration_date']}")
+
+    forecast = forecast_consumption()
+    if forecast is not None:
+        used_items = [
+            (item_id, info) for item_id, info in forecast.items() if info["daily_rate"] > 0
+        ]
+        used_items.sort(key=lambda pair: pair[1]["days_to_stockout"])
+        print(f"\nConsumption Forecast (last {FORECAST_WINDOW_DAYS} days):")
+        if not used_items:
+            print("  No recent usage recorded.")
+        for item_id, info in used_items:
+            item = inventory[item_id]
+            line = (
+                f"  - {item['item_name']}: {info['daily_rate']:.2f} {item['unit']}/day, "
+                f"{info['days_to_stockout']:.1f} days left"
+            )
+            if info["suggested_reorder"] > 0:
+                line += f", reorder {info['suggested_reorder']:.2f} {item['unit']}"
+            print(line)
+
     # Total inventory value (if you want to add prices later)
     print("\n" + "=" * 100)
 
@@ -404,10 +1053,12 @@ def display_usage_log(limit=20):
     )
     print("=" * 100)
 
-    if not usage_log:
+    recent = read_usage_log(limit)
+
+    if not recent:
         print("No usage logged yet.")
     else:
-        for log in usage_log[-limit:]:
+        for log in recent:
             print(
                 f"{log['timestamp']:<20} {log['item_name']:<25} "
                 f"{log['quantity_used']:<12.2f} {log['remaining']:<12.2f} {log['reason']:<30}"
@@ -419,7 +1070,6 @@ def display_usage_log(limit=20):
 def interactive_test():
     """Interactive testing menu"""
     load_inventory_from_csv()
-    load_usage_log_from_csv()
 
     while True:
         print("\n=== INVENTORY MANAGEMENT SYSTEM ===")
@@ -510,6 +1160,12 @@ def interactive_test():
             else:
                 for item in expiring.values():
                     print(f"{item['item_name']}: Expires on {item['expiration_date']}")
+
+            expired = check_expired()
+            if expired:
+                print(f"\nALREADY EXPIRED ({len(expired)} items)")
+                for item in expired.values():
+                    print(f"{item['item_name']}: Expired on {item['expiration_date']}")
             print("=" * 80)
 
         elif choice == "6":
@@ -535,6 +1191,7 @@ def interactive_test():
             generate_inventory_report()
 
         elif choice == "9":
+            save_usage_log_to_csv()
             print("wasd")
             break
 
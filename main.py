@@ -11,28 +11,32 @@ try:
     import ordering_table_management as order
     import billing_and_payment as billing
     import reports_and_analytics as reports
+    import storage
+    import data_loader
 except ImportError as e:
     print(f"Error importing modules: {e}")
     print("Make sure all module files are in the same directory!")
     exit(1)
 
+import os
 from datetime import datetime
 
+# Storage backend: "csv" (default) or "sqlite", e.g. RMS_STORAGE=sqlite python main.py
+STORAGE_BACKEND = os.environ.get("RMS_STORAGE", "csv")
+
 
 def main():
     """Main entry point - Login screen"""
 
     # Load all data on startup
     print("RESTAURANT MANAGEMENT SYSTEM")
+    if not storage.set_backend(STORAGE_BACKEND):
+        return
     print("Loading system data...")
 
-    um.load_users_from_csv()
-    um.load_activity_log_from_csv()
-    menu.load_menu_from_csv()
-    inv.load_inventory_from_csv()
-    inv.load_usage_log_from_csv()
-    order.load_all_data()
-    billing.load_transactions_from_csv()
+    # Only users are needed to log in; each screen loads the rest on first use
+    data_loader.load_startup()
+    data_loader.display_load_times()
 
     print("System ready!\n")
 
@@ -65,10 +69,14 @@ def main():
                 else:
                     print("Unknown role")
 
+                # Refresh snapshots after every session
+                data_loader.save_snapshots()
+
         elif choice == "2":
             register_customer()
 
         elif choice == "3":
+            data_loader.shutdown()
             print("\nThank you for using our system!")
             break
 
@@ -102,7 +110,8 @@ def admin_menu():
         print("5. Billing & Payment")
         print("6. Reports & Analytics")
         print("7. Quick Stats Dashboard")
-        print("8. Logout")
+        print("8. Storage Stats")
+        print("9. Logout")
 
         choice = input("\nChoice: ")
 
@@ -121,6 +130,9 @@ def admin_menu():
         elif choice == "7":
             show_quick_dashboard()
         elif choice == "8":
+            data_loader.display_load_times()
+            storage.display_save_stats()
+        elif choice == "9":
             um.logout()
             break
         else:
@@ -129,6 +141,8 @@ def admin_menu():
 
 def admin_user_management():
     """User management submenu"""
+    data_loader.require("users", "activity_log")
+
     while True:
         print("\n--- USER MANAGEMENT ---")
         print("1. View All Users")
@@ -170,6 +184,8 @@ def admin_user_management():
 
 def admin_menu_management():
     """Menu management submenu"""
+    data_loader.require("menu")
+
     while True:
         print("\n--- MENU MANAGEMENT ---")
         print("1. View All Menu Items")
@@ -178,12 +194,15 @@ def admin_menu_management():
         print("4. Delete Menu Item")
         print("5. Change Item Status")
         print("6. View by Category")
-        print("7. Back")
+        print("7. Search Menu")
+        print("8. Bulk Import (CSV/JSONL)")
+        print("9. Bulk Price Change")
+        print("10. Back")
 
         choice = input("\nChoice: ")
 
         if choice == "1":
-            menu.display_menu()
+            menu.display_menu_board()
         elif choice == "2":
             item_name = input("Item Name: ")
             print(f"Categories: {', '.join(menu.VALID_CATEGORIES)}")
@@ -197,7 +216,7 @@ def admin_menu_management():
             description = input("Description: ")
             menu.add_menu_item(item_name, category, price, prep_time, description)
         elif choice == "3":
-            menu.display_menu()
+            menu.display_menu_board()
             try:
                 item_id = int(input("Item ID to update: "))
                 if item_id in menu.menu_items:
@@ -221,7 +240,7 @@ def admin_menu_management():
             except ValueError:
                 print("Invalid input")
         elif choice == "4":
-            menu.display_menu()
+            menu.display_menu_board()
             try:
                 item_id = int(input("Item ID to delete: "))
                 confirm = input("Confirm deletion? (yes/no): ")
@@ -230,7 +249,7 @@ def admin_menu_management():
             except ValueError:
                 print("Invalid input")
         elif choice == "5":
-            menu.display_menu()
+            menu.display_menu_board()
             try:
                 item_id = int(input("Item ID: "))
                 print(f"Status: {', '.join(menu.VALID_STATUS)}")
@@ -244,11 +263,33 @@ def admin_menu_management():
             items = menu.get_menu_by_category(category)
             menu.display_menu(items)
         elif choice == "7":
+            keyword = input("Search: ")
+            results = menu.search_menu(keyword)
+            if not results:
+                results = menu.fuzzy_search_menu(keyword)
+                if results:
+                    print(f"\nNo exact matches for '{keyword}'. Did you mean:")
+            print(f"\nSearch Results for '{keyword}' ({len(results)} found)")
+            menu.display_menu(results)
+        elif choice == "8":
+            filename = input("File to import (.csv or .jsonl): ")
+            menu.import_menu_file(filename)
+        elif choice == "9":
+            try:
+                percent = float(input("Price change in % (e.g. 5 or -10): "))
+            except ValueError:
+                print("Invalid percentage")
+                continue
+            category = input("Category (blank for all): ").title()
+            menu.bulk_update_prices(percent, category or None)
+        elif choice == "10":
             break
 
 
 def admin_inventory_management():
     """Inventory management submenu"""
+    data_loader.require("inventory")
+
     while True:
         print("\n--- INVENTORY MANAGEMENT ---")
         print("1. View All Inventory")
@@ -258,7 +299,8 @@ def admin_inventory_management():
         print("5. Check Expiring Items")
         print("6. View Usage Log")
         print("7. Generate Inventory Report")
-        print("8. Back")
+        print("8. Manage Recipes")
+        print("9. Back")
 
         choice = input("\nChoice: ")
 
@@ -288,7 +330,12 @@ def admin_inventory_management():
             try:
                 change = float(input("Quantity to add (+) or deduct (-): "))
                 reason = input("Reason: ")
-                inv.update_stock(item_name, change, reason)
+                exp_date = None
+                if change > 0:
+                    exp_date = input(
+                        "Expiration Date of new stock (YYYY-MM-DD, blank to skip): "
+                    )
+                inv.update_stock(item_name, change, reason, exp_date or None)
             except ValueError:
                 print("Invalid quantity")
         elif choice == "4":
@@ -303,6 +350,11 @@ def admin_inventory_management():
                 print(f"\nEXPIRING IN {days} DAYS ({len(expiring)} items)")
                 for item in expiring.values():
                     print(f"  {item['item_name']}: {item['expiration_date']}")
+                expired = inv.check_expired()
+                if expired:
+                    print(f"\nALREADY EXPIRED ({len(expired)} items)")
+                    for item in expired.values():
+                        print(f"  {item['item_name']}: {item['expiration_date']}")
             except ValueError:
                 print("Invalid input")
         elif choice == "6":
@@ -314,11 +366,32 @@ def admin_inventory_management():
         elif choice == "7":
             inv.generate_inventory_report()
         elif choice == "8":
+            try:
+                menu_item_id = int(input("Menu Item ID: "))
+            except ValueError:
+                print("Invalid item ID")
+                continue
+            recipe = inv.get_recipe(menu_item_id)
+            print(f"\nRECIPE FOR MENU ITEM {menu_item_id}")
+            if not recipe:
+                print("  No ingredients set.")
+            for item_name, quantity in recipe.items():
+                print(f"  {item_name}: {quantity}")
+            item_name = input("\nIngredient Name (blank to go back): ")
+            if item_name:
+                try:
+                    quantity = float(input("Quantity per serving (0 to remove): "))
+                    inv.set_recipe_ingredient(menu_item_id, item_name, quantity)
+                except ValueError:
+                    print("Invalid quantity")
+        elif choice == "9":
             break
 
 
 def admin_ordering_management():
     """Ordering management submenu"""
+    data_loader.require("inventory", "orders")
+
     while True:
         print("\n--- ORDERING & TABLE MANAGEMENT ---")
         print("1. View All Tables")
@@ -371,6 +444,8 @@ def admin_ordering_management():
 
 def admin_billing_management():
     """Billing management submenu"""
+    data_loader.require("billing")
+
     while True:
         print("\n--- BILLING & PAYMENT ---")
         print("1. Process Payment")
@@ -482,6 +557,8 @@ def admin_reports_analytics():
 
 def show_quick_dashboard():
     """Quick overview dashboard"""
+    data_loader.require("billing", "inventory", "orders")
+
     print("\n" + "=" * 60)
     print("QUICK DASHBOARD")
     print("=" * 60)
@@ -493,8 +570,7 @@ def show_quick_dashboard():
     print(f"   Transactions: {sales['transaction_count']}")
 
     # Low stock alerts
-    low_stock = inv.check_reorder_level()
-    print(f"\nLow Stock Items: {len(low_stock)}")
+    print(f"\nLow Stock Items: {inv.low_stock_count()}")
 
     # Available tables
     available_tables = sum(
@@ -511,6 +587,7 @@ def show_quick_dashboard():
 
 def cashier_menu():
     """Cashier access - billing and viewing orders"""
+    data_loader.require("orders", "billing")
 
     while um.get_current_user():
         print("\n" + "=" * 60)
@@ -558,6 +635,7 @@ def cashier_menu():
 
 def waiter_menu():
     """Waiter access - taking orders"""
+    data_loader.require("menu", "inventory", "orders")
 
     while um.get_current_user():
         print("\n" + "=" * 60)
@@ -575,8 +653,7 @@ def waiter_menu():
         choice = input("\nChoice: ")
 
         if choice == "1":
-            available = menu.get_available_menu()
-            menu.display_menu(available)
+            menu.display_menu_board("available")
         elif choice == "2":
             order.display_all_tables()
         elif choice == "3":
@@ -607,6 +684,7 @@ def waiter_menu():
 
 def customer_menu():
     """Customer access - view menu and place orders"""
+    data_loader.require("menu", "inventory", "orders")
 
     while um.get_current_user():
         print("\n" + "=" * 60)
@@ -621,18 +699,24 @@ def customer_menu():
         choice = input("\nChoice: ")
 
         if choice == "1":
-            available = menu.get_available_menu()
-            menu.display_menu(available)
+            menu.display_menu_board("available")
         elif choice == "2":
             create_order_interactive(customer_mode=True)
         elif choice == "3":
             customer_id = um.get_current_user()
-            print(f"\nYOUR ORDERS")
-            for order_id, ord in order.orders.items():
-                if ord["customer_id"] == customer_id:
+            total = order.count_customer_orders(customer_id)
+            print(f"\nYOUR ORDERS ({total})")
+            page = 1
+            while True:
+                for order_id, ord in order.get_customer_orders(
+                    customer_id, page
+                ).items():
                     print(
                         f"Order #{order_id} | {ord['order_type']} | {ord['status']} | ₱{ord['total_amount']:.2f}"
                     )
+                if page * 10 >= total or input("Show older orders? (y/n): ") != "y":
+                    break
+                page += 1
         elif choice == "4":
             um.logout()
             break
@@ -640,10 +724,11 @@ def customer_menu():
 
 def create_order_interactive(customer_mode=False):
     """Interactive order creation"""
+    data_loader.require("menu", "inventory", "orders")
 
     # Show available menu
+    menu.display_menu_board("available")
     available = menu.get_available_menu()
-    menu.display_menu(available)
 
     # Get customer ID
     if customer_mode:
@@ -700,18 +785,23 @@ def create_order_interactive(customer_mode=False):
         print("No items selected")
         return
 
-    # Get table number for dine-in
+    # Get party size and table number for dine-in
     table_num = None
+    party_size = None
     if order_type == "Dine In":
         order.display_all_tables()
         try:
-            table_num = int(input("Table number: "))
+            party_size = int(input("Party size: "))
+            table_input = input("Table number (blank for best fit): ")
+            table_num = int(table_input) if table_input else None
         except ValueError:
-            print("Invalid table number")
+            print("Invalid number")
             return
 
     # Create order
-    order_id = order.create_order(customer_id, selected_items, order_type, table_num)
+    order_id = order.create_order(
+        customer_id, selected_items, order_type, table_num, party_size
+    )
 
     if order_id:
         print(f"\nOrder #{order_id} created successfully!")
@@ -721,6 +811,7 @@ def create_order_interactive(customer_mode=False):
 
 def process_payment_interactive():
     """Interactive payment processing"""
+    data_loader.require("orders", "billing")
 
     # Show served orders
     served = order.get_all_orders("Served")
@@ -1,43 +1,71 @@
 import csv
+import heapq
+import json
 import os
+import re
+import sys
+import time
+from bisect import bisect_left, insort
 from datetime import datetime
+from types import MappingProxyType
+
+import storage
 
 menu_items = {}
 item_counter = 1
+dirty_items = set()  # item IDs added or changed since the last save
+deleted_items = set()  # item IDs deleted since the last save
+search_index = {}  # search token -> set of item IDs
+search_tokens = []  # every token in search_index, sorted for prefix lookups
+item_tokens = {}  # item ID -> {token: weight of the best field it appears in}
+trigram_index = {}  # trigram of an item name -> set of item IDs
+item_trigrams = {}  # item ID -> set of trigrams of its name
+menu_version = 0  # bumped whenever any item changes
+rendered_boards = {}  # board filter -> (menu_version, rendered text)
 
 VALID_CATEGORIES = ["Appetizer", "Main Dish", "Dessert", "Beverage"]
 VALID_STATUS = ["Available", "Out of Stock"]
 
+category_items = {category: {} for category in VALID_CATEGORIES}  # -> {ID: item}
+status_items = {status: {} for status in VALID_STATUS}  # -> {ID: item}
+
+# How much a token counts for in each searched field
+SEARCH_WEIGHTS = {"item_name": 3, "category": 2, "description": 1}
+
+FUZZY_MIN_SIMILARITY = 0.3  # lowest trigram similarity fuzzy search returns
+
 
 def save_menu_to_csv(filename="menu_items.csv"):
-    """Save all menu items to CSV file"""
+    """Save menu items, writing only the ones changed since the last save"""
     try:
-        with open(filename, "w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(
+        storage.save_rows(
+            filename,
+            [
+                "item_id",
+                "item_name",
+                "category",
+                "price",
+                "prep_time",
+                "status",
+                "description",
+            ],
+            menu_items,
+            lambda item_id: [
                 [
-                    "item_id",
-                    "item_name",
-                    "category",
-                    "price",
-                    "prep_time",
-                    "status",
-                    "description",
+                    menu_items[item_id]["item_id"],
+                    menu_items[item_id]["item_name"],
+                    menu_items[item_id]["category"],
+                    menu_items[item_id]["price"],
+                    menu_items[item_id]["prep_time"],
+                    menu_items[item_id]["status"],
+                    menu_items[item_id]["description"],
                 ]
-            )
-
-            for item_id, item in menu_items.items():
-                writer.writerow(
-                    [
-                        item["item_id"],
-                        item["item_name"],
-                        item["category"],
-                        item["price"],
-                        item["prep_time"],
-                        item["status"],
-                        item["description"],
-                    ]
-                )
+            ],
+            dirty_items,
+            deleted_items,
+        )
+        dirty_items.clear()
+        deleted_items.clear()
         return True
     except Exception as e:
         print(f"Error saving menu: {e}")
@@ -46,33 +74,42 @@ def save_menu_to_csv(filename="menu_items.csv"):
 
 def load_menu_from_csv(filename="menu_items.csv"):
     """Load menu items from CSV file"""
-    global menu_items, item_counter
+    global menu_items, item_counter, search_index, search_tokens, item_tokens
+    global category_items, status_items, trigram_index, item_trigrams
 
-    if not os.path.exists(filename):
+    if not storage.exists(filename):
         print(f"{filename} not found. Starting with empty menu.")
         return False
 
     try:
-        with open(filename, "r") as file:
-            reader = csv.DictReader(file)
-            menu_items = {}
-            max_item_id = 0
-
-            for row in reader:
-                item_id = int(row["item_id"])
-                max_item_id = max(max_item_id, item_id)
-
-                menu_items[item_id] = {
-                    "item_id": item_id,
-                    "item_name": row["item_name"],
-                    "category": row["category"],
-                    "price": float(row["price"]),
-                    "prep_time": int(row["prep_time"]),
-                    "status": row["status"],
-                    "description": row["description"],
-                }
-
-            item_counter = max_item_id + 1
+        menu_items = {}
+        search_index = {}
+        search_tokens = []
+        item_tokens = {}
+        trigram_index = {}
+        item_trigrams = {}
+        category_items = {category: {} for category in VALID_CATEGORIES}
+        status_items = {status: {} for status in VALID_STATUS}
+        dirty_items.clear()
+        deleted_items.clear()
+        max_item_id = 0
+
+        for row in storage.load_rows(filename):
+            item_id = int(row["item_id"])
+            max_item_id = max(max_item_id, item_id)
+
+            menu_items[item_id] = {
+                "item_id": item_id,
+                "item_name": row["item_name"],
+                "category": row["category"],
+                "price": float(row["price"]),
+                "prep_time": int(row["prep_time"]),
+                "status": row["status"],
+                "description": row["description"],
+            }
+            index_item(item_id)
+
+        item_counter = max_item_id + 1
 
         print(f"Loaded {len(menu_items)} menu items from {filename}")
         return True
@@ -81,6 +118,102 @@ def load_menu_from_csv(filename="menu_items.csv"):
         return False
 
 
+def tokenize(text):
+    """Split text into lowercase search tokens"""
+    return re.findall(r"\w+", text.lower())
+
+
+def trigrams(text):
+    """Three-letter pieces of each word, padded so word starts count more"""
+    grams = set()
+    for word in tokenize(text):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def file_item(buckets, key, item_id, item):
+    """
+    File an item under one key of a category or status index
+
+    An item already under the key keeps its place, and an item that moves
+    is inserted in ID order, so boards keep listing items by ID.
+    """
+    for name, items in buckets.items():
+        if name != key:
+            items.pop(item_id, None)
+
+    items = buckets.setdefault(key, {})
+    if item_id in items or not items or item_id > next(reversed(items)):
+        items[item_id] = item
+    else:
+        # Sorted in place, since views of this dict have been handed out
+        items[item_id] = item
+        ordered = sorted(items.items())
+        items.clear()
+        items.update(ordered)
+
+
+def index_item(item_id):
+    """Add or refresh an item in the search, category and status indexes"""
+    global menu_version
+
+    # Every change to an item passes through here, so cached boards go stale
+    menu_version += 1
+
+    item = menu_items[item_id]
+    file_item(category_items, item["category"], item_id, item)
+    file_item(status_items, item["status"], item_id, item)
+
+    unindex_search_terms(item_id)
+
+    tokens = {}
+    for field, weight in SEARCH_WEIGHTS.items():
+        for token in tokenize(item[field]):
+            tokens[token] = max(tokens.get(token, 0), weight)
+
+    for token in tokens:
+        if token not in search_index:
+            search_index[token] = set()
+            insort(search_tokens, token)
+        search_index[token].add(item_id)
+    item_tokens[item_id] = tokens
+
+    grams = trigrams(item["item_name"])
+    for gram in grams:
+        trigram_index.setdefault(gram, set()).add(item_id)
+    item_trigrams[item_id] = grams
+
+
+def unindex_search_terms(item_id):
+    """Remove an item's tokens and trigrams from the search indexes"""
+    for token in item_tokens.pop(item_id, {}):
+        postings = search_index[token]
+        postings.discard(item_id)
+        if not postings:
+            del search_index[token]
+            del search_tokens[bisect_left(search_tokens, token)]
+
+    for gram in item_trigrams.pop(item_id, ()):
+        postings = trigram_index[gram]
+        postings.discard(item_id)
+        if not postings:
+            del trigram_index[gram]
+
+
+def unindex_item(item_id):
+    """Remove an item from the search, category and status indexes"""
+    global menu_version
+    menu_version += 1
+
+    for items in category_items.values():
+        items.pop(item_id, None)
+    for items in status_items.values():
+        items.pop(item_id, None)
+
+    unindex_search_terms(item_id)
+
+
 def add_menu_item(
     item_name, category, price, prep_time=10, description="", status="Available"
 ):
@@ -125,7 +258,9 @@ def add_menu_item(
         "status": status,
         "description": description,
     }
+    index_item(item_id)
 
+    dirty_items.add(item_id)
     save_menu_to_csv()
     print(f"Menu item '{item_name}' added successfully! (ID: {item_id})")
     return item_id
@@ -138,35 +273,34 @@ def update_menu_item(item_id, new_details):
         print(f"Menu item ID {item_id} not found")
         return False
 
-    item = menu_items[item_id]
-
-    if "item_name" in new_details:
-        item["item_name"] = new_details["item_name"]
-
-    if "category" in new_details:
-        if new_details["category"] not in VALID_CATEGORIES:
-            print(f"Invalid category. Must be: {', '.join(VALID_CATEGORIES)}")
-            return False
-        item["category"] = new_details["category"]
-
-    if "price" in new_details:
-        if new_details["price"] <= 0:
-            print("Price must be greater than 0")
-            return False
-        item["price"] = new_details["price"]
-
-    if "prep_time" in new_details:
-        item["prep_time"] = new_details["prep_time"]
+    # Check every field first so a rejected update changes nothing
+    if "category" in new_details and new_details["category"] not in VALID_CATEGORIES:
+        print(f"Invalid category. Must be: {', '.join(VALID_CATEGORIES)}")
+        return False
 
-    if "status" in new_details:
-        if new_details["status"] not in VALID_STATUS:
-            print(f"Invalid status. Must be: {', '.join(VALID_STATUS)}")
-            return False
-        item["status"] = new_details["status"]
+    if "price" in new_details and new_details["price"] <= 0:
+        print("Price must be greater than 0")
+        return False
 
-    if "description" in new_details:
-        item["description"] = new_details["description"]
+    if "status" in new_details and new_details["status"] not in VALID_STATUS:
+        print(f"Invalid status. Must be: {', '.join(VALID_STATUS)}")
+        return False
 
+    item = menu_items[item_id]
+    for field in (
+        "item_name",
+        "category",
+        "price",
+        "prep_time",
+        "status",
+        "description",
+    ):
+        if field in new_details:
+            item[field] = new_details[field]
+
+    index_item(item_id)
+
+    dirty_items.add(item_id)
     save_menu_to_csv()
     print(f"Menu item ID {item_id} updated successfully!")
     return True
@@ -181,12 +315,202 @@ def delete_menu_item(item_id):
 
     item_name = menu_items[item_id]["item_name"]
     del menu_items[item_id]
+    unindex_item(item_id)
 
+    dirty_items.discard(item_id)
+    deleted_items.add(item_id)
     save_menu_to_csv()
     print(f"Menu item '{item_name}' deleted successfully!")
     return True
 
 
+def read_menu_records(filename):
+    """
+    Stream records from a CSV or JSONL (one object per line) file
+
+    Yields:
+        (line number, record dictionary), or (line number, None) for a
+        line that is not valid JSON
+    """
+    with open(filename, "r", newline="") as file:
+        if os.path.splitext(filename)[1].lower() in (".jsonl", ".json"):
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                yield line_number, record if isinstance(record, dict) else None
+        else:
+            for line_number, record in enumerate(csv.DictReader(file), 2):
+                yield line_number, record
+
+
+def parse_menu_record(record, is_new):
+    """
+    Validate one imported record and convert its values
+
+    Args:
+        record: Dictionary of field -> value (text or JSON values)
+        is_new: Whether the record creates an item rather than updating one
+
+    Returns:
+        (details, None) on success, or (None, error message)
+    """
+    details = {}
+    for field in ("item_name", "category", "status", "description"):
+        value = record.get(field)
+        if value not in (None, ""):
+            details[field] = str(value).strip()
+
+    try:
+        if record.get("price") not in (None, ""):
+            details["price"] = float(record["price"])
+        if record.get("prep_time") not in (None, ""):
+            details["prep_time"] = int(record["prep_time"])
+    except (TypeError, ValueError):
+        return None, "price and prep_time must be numbers"
+
+    if is_new and not all(
+        field in details for field in ("item_name", "category", "price")
+    ):
+        return None, "new items need item_name, category and price"
+
+    if "category" in details and details["category"] not in VALID_CATEGORIES:
+        return None, f"invalid category '{details['category']}'"
+
+    if "status" in details and details["status"] not in VALID_STATUS:
+        return None, f"invalid status '{details['status']}'"
+
+    if "price" in details and details["price"] <= 0:
+        return None, "price must be greater than 0"
+
+    return details, None
+
+
+def import_menu_file(filename):
+    """
+    Add or update menu items from a CSV or JSONL file and save once
+
+    Records with an item_id of an existing item update only the fields
+    they give (blank fields are left unchanged); other records add new
+    items. Invalid records are skipped
+    and reported; the rest are applied.
+
+    Args:
+        filename: Path to a .csv or .jsonl file
+
+    Returns:
+        Dictionary with added, updated and rejected counts, or None if
+        the file cannot be read
+    """
+    global item_counter
+
+    if not os.path.exists(filename):
+        print(f"{filename} not found")
+        return None
+
+    start_time = time.perf_counter()
+    added = updated = rows = 0
+    rejected = []
+
+    try:
+        for line_number, record in read_menu_records(filename):
+            rows += 1
+            if record is None:
+                rejected.append((line_number, "not a JSON object"))
+                continue
+
+            try:
+                item_id = int(record["item_id"]) if record.get("item_id") else None
+            except (TypeError, ValueError):
+                rejected.append((line_number, "item_id must be a number"))
+                continue
+
+            is_new = item_id not in menu_items
+            details, error = parse_menu_record(record, is_new)
+            if error:
+                rejected.append((line_number, error))
+                continue
+
+            if is_new:
+                if item_id is None:
+                    item_id = item_counter
+                item_counter = max(item_counter, item_id + 1)
+                menu_items[item_id] = {
+                    "item_id": item_id,
+                    "item_name": details["item_name"],
+                    "category": details["category"],
+                    "price": details["price"],
+                    "prep_time": details.get("prep_time", 10),
+                    "status": details.get("status", "Available"),
+                    "description": details.get("description", ""),
+                }
+                deleted_items.discard(item_id)
+                added += 1
+            else:
+                menu_items[item_id].update(details)
+                updated += 1
+
+            index_item(item_id)
+            dirty_items.add(item_id)
+    except Exception as e:
+        print(f"Error reading {filename}: {e}")
+        if dirty_items:
+            save_menu_to_csv()
+        return None
+
+    if added or updated:
+        save_menu_to_csv()
+
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"Imported {filename}: {added} added, {updated} updated, "
+        f"{len(rejected)} rejected ({rows / elapsed if elapsed else rows:,.0f} rows/sec)"
+    )
+    for line_number, error in rejected[:10]:
+        print(f"  Line {line_number}: {error}")
+    if len(rejected) > 10:
+        print(f"  ... and {len(rejected) - 10} more")
+
+    return {"added": added, "updated": updated, "rejected": len(rejected)}
+
+
+def bulk_update_prices(percent, category=None):
+    """
+    Change the price of many items by a percentage and save once
+
+    Args:
+        percent: Percentage change, e.g. 5 for +5% or -10 for -10%
+        category: Only change this category (None = every item)
+
+    """
+    global menu_version
+
+    if percent <= -100:
+        print("Percentage must be greater than -100")
+        return False
+
+    if category is None:
+        items = menu_items
+    elif category in VALID_CATEGORIES:
+        items = category_items[category]
+    else:
+        print(f"Invalid category. Must be: {', '.join(VALID_CATEGORIES)}")
+        return False
+
+    factor = 1 + percent / 100
+    for item_id, item in items.items():
+        item["price"] = round(item["price"] * factor, 2)
+        dirty_items.add(item_id)
+
+    menu_version += 1
+    save_menu_to_csv()
+    print(f"Updated prices of {len(items)} items by {percent:+g}%")
+    return True
+
+
 def get_menu_item(item_id):
     if item_id not in menu_items:
         print(f"❌ Menu item ID {item_id} not found")
@@ -202,37 +526,98 @@ def get_item_price(item_id):
 
 
 def get_available_menu():
-    available = {}
-    for item_id, item in menu_items.items():
-        if item["status"] == "Available":
-            available[item_id] = item
-    return available
+    """Read-only view of the available items, kept up to date by the index"""
+    return MappingProxyType(status_items["Available"])
 
 
 def get_menu_by_category(category):
+    """Read-only view of the items in a category, kept up to date by the index"""
     if category not in VALID_CATEGORIES:
         print(f"❌ Invalid category. Must be: {', '.join(VALID_CATEGORIES)}")
-        return {}
+        return MappingProxyType({})
 
-    filtered = {}
-    for item_id, item in menu_items.items():
-        if item["category"] == category:
-            filtered[item_id] = item
-    return filtered
+    return MappingProxyType(category_items[category])
 
 
 def search_menu(keyword):
-    results = {}
-    keyword_lower = keyword.lower()
+    """
+    Search menu items by name, category and description
 
-    for item_id, item in menu_items.items():
-        if (
-            keyword_lower in item["item_name"].lower()
-            or keyword_lower in item["description"].lower()
+    Every word of the keyword must match the start of a word in the item.
+    Results are ranked by where the words matched (name before category
+    before description) and whether they matched whole words.
+
+    Args:
+        keyword: One or more words to search for
+
+    """
+    words = tokenize(keyword)
+    if not words:
+        return dict(menu_items)
+
+    scores = None
+    for word in words:
+        word_scores = {}
+        position = bisect_left(search_tokens, word)
+        while position < len(search_tokens) and search_tokens[position].startswith(
+            word
         ):
-            results[item_id] = item
+            token = search_tokens[position]
+            bonus = 2 if token == word else 1
+            for item_id in search_index[token]:
+                score = item_tokens[item_id][token] * bonus
+                if score > word_scores.get(item_id, 0):
+                    word_scores[item_id] = score
+            position += 1
+
+        if scores is None:
+            scores = word_scores
+        else:
+            scores = {
+                item_id: score + word_scores[item_id]
+                for item_id, score in scores.items()
+                if item_id in word_scores
+            }
+        if not scores:
+            return {}
+
+    ranked = sorted(
+        scores, key=lambda item_id: (-scores[item_id], menu_items[item_id]["item_name"])
+    )
+    return {item_id: menu_items[item_id] for item_id in ranked}
+
 
-    return results
+def fuzzy_search_menu(query, limit=5):
+    """
+    Find items whose names are spelled like the query
+
+    Items are scored by the Jaccard similarity of their name trigrams
+    with the query's, counted from the trigram postings only.
+
+    Args:
+        query: Possibly misspelled item name
+        limit: Most results to return
+
+    Returns:
+        Dictionary of the best matching items, most similar first
+    """
+    query_grams = trigrams(query)
+    if not query_grams:
+        return {}
+
+    shared = {}
+    for gram in query_grams:
+        for item_id in trigram_index.get(gram, ()):
+            shared[item_id] = shared.get(item_id, 0) + 1
+
+    scores = {}
+    for item_id, count in shared.items():
+        similarity = count / (len(query_grams) + len(item_trigrams[item_id]) - count)
+        if similarity >= FUZZY_MIN_SIMILARITY:
+            scores[item_id] = similarity
+
+    best = heapq.nlargest(limit, scores, key=scores.get)
+    return {item_id: menu_items[item_id] for item_id in best}
 
 
 def set_item_status(item_id, status):
@@ -245,34 +630,70 @@ def set_item_status(item_id, status):
         return False
 
     menu_items[item_id]["status"] = status
+    index_item(item_id)
+    dirty_items.add(item_id)
     save_menu_to_csv()
 
     print(f"Item '{menu_items[item_id]['item_name']}' is now {status}")
     return True
 
 
-def display_menu(items_dict=None):
-    """Display menu items in a formatted table"""
-    if items_dict is None:
-        items_dict = menu_items
-
-    print("\n" + "=" * 100)
-    print(
-        f"{'ID':<5} {'Name':<25} {'Category':<15} {'Price':<10} {'Prep Time':<12} {'Status':<15}"
-    )
-    print("=" * 100)
+def render_menu(items_dict):
+    """Format menu items as a table, returned as one string"""
+    lines = [
+        "",
+        "=" * 100,
+        f"{'ID':<5} {'Name':<25} {'Category':<15} {'Price':<10} {'Prep Time':<12} {'Status':<15}",
+        "=" * 100,
+    ]
 
     if not items_dict:
-        print("No items found.")
+        lines.append("No items found.")
     else:
-        for item_id, item in items_dict.items():
+        for item in items_dict.values():
             status_icon = "🟢" if item["status"] == "Available" else "🔴"
-            print(
+            lines.append(
                 f"{item['item_id']:<5} {item['item_name']:<25} {item['category']:<15} "
                 f"₱{item['price']:<9.2f} {item['prep_time']} mins{'':<6} {status_icon} {item['status']:<10}"
             )
 
-    print("=" * 100)
+    lines.append("=" * 100)
+    return "\n".join(lines) + "\n"
+
+
+def display_menu(items_dict=None):
+    """Display menu items in a formatted table"""
+    if items_dict is None:
+        items_dict = menu_items
+
+    sys.stdout.write(render_menu(items_dict))
+
+
+def display_menu_board(board="all"):
+    """
+    Display a menu board, re-rendering it only if the menu changed
+
+    Args:
+        board: 'all', 'available' or a category name
+
+    """
+    if board == "all":
+        items_dict = menu_items
+    elif board == "available":
+        items_dict = status_items["Available"]
+    elif board in VALID_CATEGORIES:
+        items_dict = category_items[board]
+    else:
+        print(f"Invalid board. Must be: all, available, {', '.join(VALID_CATEGORIES)}")
+        return False
+
+    cached = rendered_boards.get(board)
+    if cached is None or cached[0] != menu_version:
+        cached = (menu_version, render_menu(items_dict))
+        rendered_boards[board] = cached
+
+    sys.stdout.write(cached[1])
+    return True
 
 
 def display_menu_details(item_id):
@@ -424,6 +845,10 @@ def interactive_test():
         elif choice == "7":
             keyword = input("\nSearch keyword: ")
             results = search_menu(keyword)
+            if not results:
+                results = fuzzy_search_menu(keyword)
+                if results:
+                    print(f"\nNo exact matches for '{keyword}'. Did you mean:")
             print(f"\nSearch Results for '{keyword}' ({len(results)} found)")
             display_menu(results)
 
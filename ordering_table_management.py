@@ -1,10 +1,37 @@
-from datetime import datetime
-import csv
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import json
 import os
 
+import inventory_management as inv
+import storage
+
 orders = {}
 tables = {}
 order_counter = 1000
+dirty_tables = set()  # table numbers changed since the last save
+dirty_orders = set()  # order IDs whose order or items changed since the last save
+deleted_orders = set()  # order IDs moved to the archive since the last save
+status_index = {}  # order status -> {order ID: None}, in the order they got it
+customer_orders = {}  # customer ID -> [(order time, order ID)], oldest first
+free_tables = {}  # capacity -> sorted numbers of the free tables with it
+free_capacities = []  # sorted capacities that have at least one free table
+table_adjacency = {}  # table number -> set of tables it can be pushed together with
+table_groups = {}  # order ID -> table numbers seating it, first one on the order
+
+ORDER_JOURNAL_FILE = "order_journal.jsonl"
+JOURNAL_COMPACT_THRESHOLD = 500  # compact into the CSV files after this many entries
+journal_entries = 0
+
+TABLE_ADJACENCY_FILE = "table_adjacency.csv"
+
+ORDER_ARCHIVE_FILE = "orders_archive.jsonl"
+ORDER_ARCHIVE_INDEX_FILE = "orders_archive_index.csv"
+ARCHIVE_AFTER_DAYS = 30  # closed orders older than this move to the archive
+ARCHIVE_CACHE_SIZE = 100  # archived orders kept in memory after being read
+archive_offsets = {}  # archived order ID -> byte offset of its line in the archive
+archive_cache = OrderedDict()  # recently read archived orders, least recent first
 
 SAMPLE_MENU = [
     {"item_id": 1, "item_name": "Burger", "quantity": 1, "price": 150},
@@ -17,21 +44,26 @@ SAMPLE_MENU = [
 
 
 def save_tables_to_csv(filename="tables.csv"):
-    """Save all tables to CSV file"""
+    """Save tables, writing only the ones changed since the last save"""
     try:
-        with open(filename, "w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(["table_number", "status", "order_id", "capacity"])
-
-            for table_num, table_info in tables.items():
-                writer.writerow(
-                    [
-                        table_num,
-                        table_info["status"],
-                        table_info["order_id"] if table_info["order_id"] else "",
-                        table_info["capacity"],
-                    ]
-                )
+        storage.save_rows(
+            filename,
+            ["table_number", "status", "order_id", "capacity"],
+            tables,
+            lambda table_num: [
+                [
+                    table_num,
+                    tables[table_num]["status"],
+                    (
+                        tables[table_num]["order_id"]
+                        if tables[table_num]["order_id"]
+                        else ""
+                    ),
+                    tables[table_num]["capacity"],
+                ]
+            ],
+            dirty_tables,
+        )
         return True
     except Exception as e:
         print(f"Error saving tables: {e}")
@@ -42,24 +74,27 @@ def load_tables_from_csv(filename="tables.csv"):
     """Load tables from CSV file"""
     global tables
 
-    if not os.path.exists(filename):
+    if not storage.exists(filename):
         print(f"{filename} not found. Initializing default tables.")
         initialize_tables()
+        save_tables_to_csv(filename)
         return False
 
     try:
-        with open(filename, "r") as file:
-            reader = csv.DictReader(file)
-            tables = {}
-
-            for row in reader:
-                table_num = int(row["table_number"])
-                tables[table_num] = {
-                    "status": row["status"],
-                    "order_id": int(row["order_id"]) if row["order_id"] else None,
-                    "capacity": int(row["capacity"]),
-                }
-
+        tables = {}
+        dirty_tables.clear()
+
+        for row in storage.load_rows(filename):
+            table_num = int(row["table_number"])
+            tables[table_num] = {
+                "status": row["status"],
+                "order_id": int(row["order_id"]) if row["order_id"] else None,
+                "capacity": int(row["capacity"]),
+            }
+
+        rebuild_free_tables()
+        rebuild_table_groups()
+        load_table_adjacency()
         print(f"Loaded {len(tables)} tables from {filename}")
         return True
     except Exception as e:
@@ -68,34 +103,38 @@ def load_tables_from_csv(filename="tables.csv"):
 
 
 def save_orders_to_csv(filename="orders.csv"):
-    """Save all orders to CSV file"""
+    """Save orders, writing only the ones changed since the last save"""
     try:
-        with open(filename, "w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(
+        storage.save_rows(
+            filename,
+            [
+                "order_id",
+                "customer_id",
+                "order_type",
+                "table_number",
+                "status",
+                "order_time",
+                "total_amount",
+            ],
+            orders,
+            lambda order_id: [
                 [
-                    "order_id",
-                    "customer_id",
-                    "order_type",
-                    "table_number",
-                    "status",
-                    "order_time",
-                    "total_amount",
+                    orders[order_id]["order_id"],
+                    orders[order_id]["customer_id"],
+                    orders[order_id]["order_type"],
+                    (
+                        orders[order_id]["table_number"]
+                        if orders[order_id]["table_number"]
+                        else ""
+                    ),
+                    orders[order_id]["status"],
+                    orders[order_id]["order_time"],
+                    orders[order_id]["total_amount"],
                 ]
-            )
-
-            for order_id, order in orders.items():
-                writer.writerow(
-                    [
-                        order["order_id"],
-                        order["customer_id"],
-                        order["order_type"],
-                        order["table_number"] if order["table_number"] else "",
-                        order["status"],
-                        order["order_time"],
-                        order["total_amount"],
-                    ]
-                )
+            ],
+            dirty_orders,
+            deleted_orders,
+        )
         return True
     except Exception as e:
         print(f"Error saving orders: {e}")
@@ -104,36 +143,39 @@ def save_orders_to_csv(filename="orders.csv"):
 
 def load_orders_from_csv(filename="orders.csv"):
     """Load orders from CSV file"""
-    global orders, order_counter
+    global orders, order_counter, status_index, customer_orders
 
-    if not os.path.exists(filename):
+    if not storage.exists(filename):
         print(f"{filename} not found. Starting fresh.")
         return False
 
     try:
-        with open(filename, "r") as file:
-            reader = csv.DictReader(file)
-            orders = {}
-            max_order_id = 1000
-
-            for row in reader:
-                order_id = int(row["order_id"])
-                max_order_id = max(max_order_id, order_id)
-
-                orders[order_id] = {
-                    "order_id": order_id,
-                    "customer_id": row["customer_id"],
-                    "order_type": row["order_type"],
-                    "table_number": (
-                        int(row["table_number"]) if row["table_number"] else None
-                    ),
-                    "status": row["status"],
-                    "order_time": row["order_time"],
-                    "total_amount": float(row["total_amount"]),
-                    "order_items": [],
-                }
-
-            order_counter = max_order_id + 1
+        orders = {}
+        status_index = {}
+        customer_orders = {}
+        dirty_orders.clear()
+        max_order_id = 1000
+
+        for row in storage.load_rows(filename):
+            order_id = int(row["order_id"])
+            max_order_id = max(max_order_id, order_id)
+
+            orders[order_id] = {
+                "order_id": order_id,
+                "customer_id": row["customer_id"],
+                "order_type": row["order_type"],
+                "table_number": (
+                    int(row["table_number"]) if row["table_number"] else None
+                ),
+                "status": row["status"],
+                "order_time": row["order_time"],
+                "total_amount": float(row["total_amount"]),
+                "order_items": [],
+                "ingredients": [],
+            }
+            index_order(order_id)
+
+        order_counter = max_order_id + 1
 
         print(f"Loaded {len(orders)} orders from {filename}")
         return True
@@ -143,23 +185,25 @@ def load_orders_from_csv(filename="orders.csv"):
 
 
 def save_order_items_to_csv(filename="order_items.csv"):
-    """Save all order items to CSV file"""
+    """Save order items, writing only orders changed since the last save"""
     try:
-        with open(filename, "w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(["order_id", "item_id", "item_name", "quantity", "price"])
-
-            for order_id, order in orders.items():
-                for item in order["order_items"]:
-                    writer.writerow(
-                        [
-                            order_id,
-                            item["item_id"],
-                            item["item_name"],
-                            item["quantity"],
-                            item["price"],
-                        ]
-                    )
+        storage.save_rows(
+            filename,
+            ["order_id", "item_id", "item_name", "quantity", "price"],
+            orders,
+            lambda order_id: [
+                [
+                    order_id,
+                    item["item_id"],
+                    item["item_name"],
+                    item["quantity"],
+                    item["price"],
+                ]
+                for item in orders[order_id]["order_items"]
+            ],
+            dirty_orders,
+            deleted_orders,
+        )
         return True
     except Exception as e:
         print(f"Error saving order items: {e}")
@@ -170,26 +214,23 @@ def load_order_items_from_csv(filename="order_items.csv"):
     """Load order items from CSV file"""
     global orders
 
-    if not os.path.exists(filename):
+    if not storage.exists(filename):
         print(f"{filename} not found.")
         return False
 
     try:
-        with open(filename, "r") as file:
-            reader = csv.DictReader(file)
-
-            for row in reader:
-                order_id = int(row["order_id"])
-
-                if order_id in orders:
-                    orders[order_id]["order_items"].append(
-                        {
-                            "item_id": int(row["item_id"]),
-                            "item_name": row["item_name"],
-                            "quantity": int(row["quantity"]),
-                            "price": float(row["price"]),
-                        }
-                    )
+        for row in storage.load_rows(filename):
+            order_id = int(row["order_id"])
+
+            if order_id in orders:
+                orders[order_id]["order_items"].append(
+                    {
+                        "item_id": int(row["item_id"]),
+                        "item_name": row["item_name"],
+                        "quantity": int(row["quantity"]),
+                        "price": float(row["price"]),
+                    }
+                )
 
         print(f"Order items loaded from {filename}")
         return True
@@ -198,11 +239,352 @@ def load_order_items_from_csv(filename="order_items.csv"):
         return False
 
 
+def save_order_ingredients_to_csv(filename="order_ingredients.csv"):
+    """Save the stock lots each order took, writing only changed orders"""
+    try:
+        storage.save_rows(
+            filename,
+            ["order_id", "item_id", "quantity", "expiration_date"],
+            orders,
+            lambda order_id: [
+                [
+                    order_id,
+                    part["item_id"],
+                    part["quantity"],
+                    part["expiration_date"],
+                ]
+                for part in orders[order_id].get("ingredients", [])
+            ],
+            dirty_orders,
+            deleted_orders,
+        )
+        return True
+    except Exception as e:
+        print(f"Error saving order ingredients: {e}")
+        return False
+
+
+def load_order_ingredients_from_csv(filename="order_ingredients.csv"):
+    """Load the stock lots each order took from CSV file"""
+    global orders
+
+    if not storage.exists(filename):
+        return False
+
+    try:
+        for row in storage.load_rows(filename):
+            order_id = int(row["order_id"])
+
+            if order_id in orders:
+                orders[order_id]["ingredients"].append(
+                    {
+                        "item_id": int(row["item_id"]),
+                        "quantity": float(row["quantity"]),
+                        "expiration_date": row["expiration_date"],
+                    }
+                )
+
+        return True
+    except Exception as e:
+        print(f"Error loading order ingredients: {e}")
+        return False
+
+
+def index_order(order_id):
+    """
+    File an order under its current status, removing it from its old one,
+    and under its customer if it is not there yet
+    """
+    order = orders[order_id]
+    status = order["status"]
+    for status_name, order_ids in status_index.items():
+        if status_name != status:
+            order_ids.pop(order_id, None)
+    status_index.setdefault(status, {})[order_id] = None
+
+    add_customer_order(order["customer_id"], order["order_time"], order_id)
+
+
+def add_customer_order(customer_id, order_time, order_id):
+    """Insert an order into its customer's time-ordered history once"""
+    history = customer_orders.setdefault(customer_id, [])
+    key = (order_time, order_id)
+    position = bisect_left(history, key)
+    if position == len(history) or history[position] != key:
+        history.insert(position, key)
+
+
 def save_all_data():
     """Save all data (tables, orders, and order items) to CSV files"""
-    save_tables_to_csv()
-    save_orders_to_csv()
-    save_order_items_to_csv()
+    saved_tables = save_tables_to_csv()
+    saved_orders = save_orders_to_csv()
+    saved_items = save_order_items_to_csv()
+    saved_ingredients = save_order_ingredients_to_csv()
+
+    if saved_tables and saved_orders and saved_items and saved_ingredients:
+        dirty_tables.clear()
+        dirty_orders.clear()
+        deleted_orders.clear()
+        return True
+    return False
+
+
+def append_to_journal(order_id, table_numbers=(), filename=ORDER_JOURNAL_FILE):
+    """
+    Append one order change to the order journal
+
+    Instead of rewriting tables.csv, orders.csv and order_items.csv after
+    every change, the new state of the touched order and tables is written
+    as a single JSON line. The journal is replayed by load_all_data() and
+    folded back into the CSV files by compact_order_journal().
+
+    Args:
+        order_id: ID of the order that changed
+        table_numbers: Tables whose status changed along with the order
+        filename: Path to the journal file
+
+    """
+    global journal_entries
+
+    record = {
+        "order": orders.get(order_id),
+        "tables": {
+            str(table_num): tables[table_num]
+            for table_num in table_numbers
+            if table_num in tables
+        },
+    }
+
+    try:
+        with open(filename, "a") as file:
+            file.write(json.dumps(record) + "\n")
+        journal_entries += 1
+    except Exception as e:
+        print(f"Error writing order journal: {e}")
+        return False
+
+    if journal_entries >= JOURNAL_COMPACT_THRESHOLD:
+        compact_order_journal(filename)
+
+    return True
+
+
+def persist_order_change(order_id, table_numbers=()):
+    """
+    Persist one changed order and its tables
+
+    The SQLite backend updates just those rows in place. The CSV backend
+    appends the change to the order journal.
+    """
+    dirty_orders.add(order_id)
+    dirty_tables.update(table_numbers)
+
+    if storage.backend == "sqlite":
+        return save_all_data()
+
+    return append_to_journal(order_id, table_numbers)
+
+
+def replay_order_journal(filename=ORDER_JOURNAL_FILE):
+    """Apply journal entries written since the last compaction"""
+    global orders, tables, order_counter, journal_entries
+
+    journal_entries = 0
+
+    if not os.path.exists(filename):
+        return 0
+
+    try:
+        with open(filename, "r") as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash mid-write can leave a partial last line
+                    print("Skipping unreadable order journal entry")
+                    continue
+
+                order = record.get("order")
+                # Entries for orders archived before the journal was cleared
+                if order and order["order_id"] not in archive_offsets:
+                    orders[order["order_id"]] = order
+                    index_order(order["order_id"])
+                    order_counter = max(order_counter, order["order_id"] + 1)
+                    dirty_orders.add(order["order_id"])
+
+                for table_num, table_info in record.get("tables", {}).items():
+                    tables[int(table_num)] = table_info
+                    dirty_tables.add(int(table_num))
+
+                journal_entries += 1
+
+        if journal_entries:
+            rebuild_free_tables()
+            rebuild_table_groups()
+            print(f"Replayed {journal_entries} order journal entries")
+        return journal_entries
+    except Exception as e:
+        print(f"Error replaying order journal: {e}")
+        return 0
+
+
+def compact_order_journal(filename=ORDER_JOURNAL_FILE):
+    """Archive cold orders, write full CSV snapshots and clear the order journal"""
+    global journal_entries
+
+    archive_cold_orders()
+
+    if (
+        journal_entries == 0
+        and not dirty_orders
+        and not dirty_tables
+        and not deleted_orders
+    ):
+        return True  # nothing changed since the last compaction
+
+    if not save_all_data():
+        print("Order journal kept because the CSV snapshot failed")
+        return False
+
+    try:
+        open(filename, "w").close()
+        journal_entries = 0
+        return True
+    except Exception as e:
+        print(f"Error clearing order journal: {e}")
+        return False
+
+
+def load_order_archive_index(filename=ORDER_ARCHIVE_INDEX_FILE):
+    """Load the locations of archived orders"""
+    global archive_offsets, order_counter
+
+    archive_offsets = {}
+    archive_cache.clear()
+
+    if not storage.exists(filename):
+        return False
+
+    try:
+        for row in storage.load_rows(filename):
+            order_id = int(row["order_id"])
+            # A crash mid-archive can leave an order indexed twice
+            if order_id in archive_offsets:
+                continue
+            archive_offsets[order_id] = int(row["offset"])
+
+            # Archived orders still belong to their customer's history
+            if row.get("customer_id"):
+                add_customer_order(row["customer_id"], row["order_time"], order_id)
+
+            # A crash before the CSV files were saved leaves it in orders too
+            if order_id in orders:
+                drop_archived_order(order_id)
+
+        # Archived IDs must not be handed out again
+        if archive_offsets:
+            order_counter = max(order_counter, max(archive_offsets) + 1)
+        return True
+    except Exception as e:
+        print(f"Error loading order archive index: {e}")
+        return False
+
+
+def drop_archived_order(order_id):
+    """Remove an archived order from memory and from the CSV files on next save"""
+    status_index[orders[order_id]["status"]].pop(order_id, None)
+    del orders[order_id]
+    dirty_orders.discard(order_id)
+    deleted_orders.add(order_id)
+
+
+def archive_cold_orders(
+    days=ARCHIVE_AFTER_DAYS,
+    filename=ORDER_ARCHIVE_FILE,
+    index_file=ORDER_ARCHIVE_INDEX_FILE,
+):
+    """
+    Move Completed and Cancelled orders older than days to the archive
+
+    Each order is appended to the archive as one JSON line and its byte
+    offset, customer and order time to the archive index. The orders leave
+    the in-memory dict and are removed from the CSV files on the next save.
+    Orders already in the archive are only removed, not written again.
+
+    Returns:
+        Number of orders archived
+    """
+    cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    cold = [
+        order_id
+        for status in ("Completed", "Cancelled")
+        for order_id in status_index.get(status, ())
+        if orders[order_id]["order_time"] < cutoff
+    ]
+    if not cold:
+        return 0
+
+    try:
+        index_rows = []
+        with open(filename, "ab") as file:
+            for order_id in cold:
+                if order_id in archive_offsets:
+                    continue
+                order = orders[order_id]
+                index_rows.append(
+                    [order_id, file.tell(), order["customer_id"], order["order_time"]]
+                )
+                file.write(json.dumps(order).encode() + b"\n")
+        storage.append_rows(
+            index_file, ["order_id", "offset", "customer_id", "order_time"], index_rows
+        )
+    except Exception as e:
+        print(f"Error archiving orders: {e}")
+        return 0
+
+    for order_id, offset, customer_id, order_time in index_rows:
+        archive_offsets[order_id] = offset
+    for order_id in cold:
+        drop_archived_order(order_id)
+
+    print(f"Archived {len(cold)} orders older than {days} days")
+    return len(cold)
+
+
+def read_archived_order(order_id, filename=ORDER_ARCHIVE_FILE):
+    """Read one archived order, keeping recently read ones in memory"""
+    if order_id in archive_cache:
+        archive_cache.move_to_end(order_id)
+        return archive_cache[order_id]
+
+    offset = archive_offsets.get(order_id)
+    if offset is None:
+        return None
+
+    try:
+        with open(filename, "rb") as file:
+            file.seek(offset)
+            order = json.loads(file.readline())
+    except Exception as e:
+        print(f"Error reading archived order {order_id}: {e}")
+        return None
+
+    archive_cache[order_id] = order
+    if len(archive_cache) > ARCHIVE_CACHE_SIZE:
+        archive_cache.popitem(last=False)
+    return order
+
+
+def find_order(order_id):
+    """Get an order from memory, or from the archive if it was archived"""
+    order = orders.get(order_id)
+    if order is None:
+        order = read_archived_order(order_id)
+    return order
 
 
 def load_all_data():
@@ -211,6 +593,9 @@ def load_all_data():
     load_tables_from_csv()
     load_orders_from_csv()
     load_order_items_from_csv()
+    load_order_ingredients_from_csv()
+    load_order_archive_index()
+    replay_order_journal()
     print("Data loaded!\n")
 
 
@@ -218,17 +603,265 @@ def initialize_tables(num_tables=10):
     global tables
     for i in range(1, num_tables + 1):
         tables[i] = {"status": "Available", "order_id": None, "capacity": 4}
+        dirty_tables.add(i)
+    rebuild_free_tables()
+    rebuild_table_groups()
+    load_table_adjacency()
     print(f"Initialized {num_tables} tables")
 
 
-def create_order(customer_id, order_items, order_type, table_number=None):
+def load_table_adjacency(filename=TABLE_ADJACENCY_FILE):
+    """
+    Load which tables can be pushed together for large parties
+
+    Each row of the file links two tables (table_number, adjacent_to).
+    Without the file the tables stand in one row, each next to the
+    tables numbered just before and after it.
+    """
+    global table_adjacency
+
+    table_adjacency = {table_num: set() for table_num in tables}
+
+    if storage.exists(filename):
+        try:
+            for row in storage.load_rows(filename):
+                first = int(row["table_number"])
+                second = int(row["adjacent_to"])
+                if first in tables and second in tables:
+                    table_adjacency[first].add(second)
+                    table_adjacency[second].add(first)
+            return True
+        except Exception as e:
+            print(f"Error loading table adjacency, using one row: {e}")
+            table_adjacency = {table_num: set() for table_num in tables}
+
+    numbers = sorted(tables)
+    for first, second in zip(numbers, numbers[1:]):
+        table_adjacency[first].add(second)
+        table_adjacency[second].add(first)
+    return False
+
+
+def rebuild_table_groups():
+    """Rebuild which tables seat each order from the tables' order IDs"""
+    global table_groups
+
+    table_groups = {}
+    for table_num in sorted(tables):
+        order_id = tables[table_num]["order_id"]
+        if order_id and tables[table_num]["status"] == "Occupied":
+            table_groups.setdefault(order_id, []).append(table_num)
+
+    # The table on the order comes first
+    for order_id, group in table_groups.items():
+        primary = orders.get(order_id, {}).get("table_number")
+        if primary in group:
+            group.remove(primary)
+            group.insert(0, primary)
+
+
+def rebuild_free_tables():
+    """Rebuild the free-lists from the status of every table"""
+    global free_tables, free_capacities
+
+    free_tables = {}
+    for table_num in sorted(tables):
+        if tables[table_num]["status"] != "Occupied":
+            free_tables.setdefault(tables[table_num]["capacity"], []).append(
+                table_num
+            )
+    free_capacities = sorted(free_tables)
+
+
+def mark_table_free(table_number):
+    """Put a table back on the free-list for its capacity"""
+    capacity = tables[table_number]["capacity"]
+    bucket = free_tables.get(capacity)
+    if bucket is None:
+        bucket = free_tables[capacity] = []
+        insort(free_capacities, capacity)
+
+    position = bisect_left(bucket, table_number)
+    if position == len(bucket) or bucket[position] != table_number:
+        bucket.insert(position, table_number)
+
+
+def mark_table_taken(table_number):
+    """Take a table off the free-list for its capacity"""
+    capacity = tables[table_number]["capacity"]
+    bucket = free_tables.get(capacity, [])
+
+    position = bisect_left(bucket, table_number)
+    if position < len(bucket) and bucket[position] == table_number:
+        del bucket[position]
+
+    if capacity in free_tables and not bucket:
+        del free_tables[capacity]
+        del free_capacities[bisect_left(free_capacities, capacity)]
+
+
+def allocate_table(party_size):
+    """
+    Find the free table that best fits a party
+
+    Args:
+        party_size: Number of guests
+
+    Returns:
+        The lowest-numbered free table with the smallest capacity that
+        seats the party, or None if no free table is big enough
+    """
+    position = bisect_left(free_capacities, party_size)
+    if position == len(free_capacities):
+        return None
+    return free_tables[free_capacities[position]][0]
+
+
+def find_table_group(party_size):
+    """
+    Find the fewest adjacent free tables that together seat a party
+
+    Connected groups of free tables are searched by size, one table, then
+    two, and so on, so the first size with a group that seats the party is
+    the fewest tables possible; within that size the first group found
+    with the fewest spare seats wins. Each group is grown only from tables
+    numbered above its lowest table so it is generated once. Growth stops
+    as soon as even the largest free tables could not make up the missing
+    seats, or even the smallest would leave no fewer spare seats than the
+    best group so far, and the search ends at a group with none spare.
+
+    Args:
+        party_size: Number of guests
+
+    Returns:
+        List of table numbers, or None if no connected free tables seat the party
+    """
+    free = set()
+    for bucket in free_tables.values():
+        free.update(bucket)
+
+    # most_seats[k] and least_seats[k] are the most and fewest seats any k
+    # free tables have
+    capacities = sorted(tables[t]["capacity"] for t in free)
+    most_seats = [0]
+    least_seats = [0]
+    for large, small in zip(reversed(capacities), capacities):
+        most_seats.append(most_seats[-1] + large)
+        least_seats.append(least_seats[-1] + small)
+
+    def extend(group, seats, extension, reached, size, best):
+        if len(group) == size:
+            if seats >= party_size and (best is None or seats < best[0]):
+                best = (seats, sorted(group))
+            return best
+        missing = size - len(group)
+        if seats + most_seats[missing] < party_size:
+            return best
+        if best is not None and seats + least_seats[missing] >= best[0]:
+            return best
+
+        extension = list(extension)
+        while extension:
+            table_num = extension.pop()
+            neighbours = table_adjacency.get(table_num, ())
+            new = [
+                n for n in neighbours if n in free and n > group[0] and n not in reached
+            ]
+            best = extend(
+                group + [table_num],
+                seats + tables[table_num]["capacity"],
+                extension + new,
+                reached.union(neighbours),
+                size,
+                best,
+            )
+        return best
+
+    for size in range(1, len(free) + 1):
+        if most_seats[size] < party_size:
+            continue
+
+        best = None
+        for seed in sorted(free):
+            neighbours = table_adjacency.get(seed, ())
+            best = extend(
+                [seed],
+                tables[seed]["capacity"],
+                [n for n in neighbours if n in free and n > seed],
+                set(neighbours) | {seed},
+                size,
+                best,
+            )
+            if best and best[0] == party_size:
+                break
+        if best:
+            return best[1]
+
+    return None
+
+
+def release_table(table_number):
+    """Free a table when its order is completed or cancelled"""
+    if table_number not in tables:
+        return False
+
+    tables[table_number]["status"] = "Available"
+    tables[table_number]["order_id"] = None
+    mark_table_free(table_number)
+    return True
+
+
+def release_order_tables(order_id):
+    """
+    Free every table seating an order
+
+    Returns:
+        List of the released table numbers
+    """
+    group = table_groups.pop(order_id, None)
+    if group is None:
+        table_number = orders[order_id]["table_number"]
+        group = [table_number] if table_number else []
+
+    released = []
+    for table_num in group:
+        if table_num in tables and tables[table_num]["order_id"] == order_id:
+            release_table(table_num)
+            released.append(table_num)
+    return released
+
+
+def create_order(
+    customer_id, order_items, order_type, table_number=None, party_size=None
+):
+    """
+    Create an order
+
+    Args:
+        customer_id: Customer placing the order
+        order_items: List of dictionaries with item_id, item_name, quantity, price
+        order_type: Dine In, Takeout, or Delivery
+        table_number: Table for dine-in orders (None = pick one for party_size)
+        party_size: Number of guests, used to pick or check the table. A
+            party too big for any one free table gets adjacent tables combined.
+
+    """
     global orders, order_counter
 
     if order_type not in ["Dine In", "Takeout", "Delivery"]:
         print(f"Invalid order type. Must be Dine In, Takeout, or Delivery")
         return None
 
+    table_group = None
     if order_type == "Dine In":
+        if table_number is None and party_size:
+            table_number = allocate_table(party_size)
+            if table_number is None:
+                table_group = find_table_group(party_size)
+                if table_group is None:
+                    print(f"No free tables seat a party of {party_size}")
+                    return None
+                table_number = table_group[0]
         if table_number is None:
             print("Table number is required for dine-in orders")
             return None
@@ -238,12 +871,31 @@ def create_order(customer_id, order_items, order_type, table_number=None):
         if tables[table_number]["status"] == "Occupied":
             print(f"Table {table_number} is already occupied")
             return None
+        if (
+            table_group is None
+            and party_size
+            and party_size > tables[table_number]["capacity"]
+        ):
+            print(
+                f"Table {table_number} seats {tables[table_number]['capacity']}, "
+                f"not {party_size}"
+            )
+            return None
 
     if not order_items or len(order_items) == 0:
         print("Order must have at least one item")
         return None
 
     order_id = order_counter
+
+    # Take every ingredient the order needs in one stock transaction, noting
+    # the lots used so a cancellation gives back exactly what was taken
+    demand = inv.ingredient_demand(order_items)
+    taken = []
+    if demand and not inv.deduct_ingredients(demand, f"Order {order_id}", taken):
+        print("Order rejected: insufficient stock")
+        return None
+
     order_counter += 1
 
     total_amount = 0
@@ -259,13 +911,17 @@ def create_order(customer_id, order_items, order_type, table_number=None):
         "status": "Pending",
         "order_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "total_amount": total_amount,
+        "ingredients": taken,
     }
+    index_order(order_id)
 
+    seated_tables = []
     if order_type == "Dine In" and table_number:
-        assign_table(table_number, order_id)
+        seated_tables = table_group or [table_number]
+        assign_table_group(seated_tables, order_id)
 
     print(f"Order {order_id} created successfully!")
-    save_all_data()
+    persist_order_change(order_id, seated_tables)
     return order_id
 
 
@@ -282,6 +938,38 @@ def update_order(order_id, new_items):
         print(f"Cannot update order with status: {order['status']}")
         return False
 
+    # Only the difference between what the order took and what the new
+    # items need changes stock; returns come from its latest-expiring lots
+    reason = f"Order {order_id} updated"
+    taken = [dict(part) for part in order.get("ingredients", [])]
+    held = {}
+    for part in taken:
+        held[part["item_id"]] = held.get(part["item_id"], 0) + part["quantity"]
+    new_demand = inv.ingredient_demand(new_items)
+
+    changes = []
+    for item_id in sorted(held.keys() | new_demand.keys()):
+        change = held.get(item_id, 0) - new_demand.get(item_id, 0)
+        if change < 0:
+            changes.append((item_id, change, reason))
+        # Ingredients since removed from inventory cannot be given back
+        elif change > 0 and item_id in inv.inventory:
+            for part in reversed(taken):
+                if change <= 1e-9:
+                    break
+                if part["item_id"] != item_id:
+                    continue
+                returned = min(part["quantity"], change)
+                part["quantity"] -= returned
+                change -= returned
+                changes.append((item_id, returned, reason, part["expiration_date"]))
+
+    added = []
+    if changes and not inv.update_stock_batch(changes, added):
+        print(f"Order {order_id} not updated: not enough stock for the new items")
+        return False
+
+    order["ingredients"] = [part for part in taken if part["quantity"] > 1e-9] + added
     order["order_items"] = new_items
     total_amount = 0
     for item in new_items:
@@ -289,7 +977,7 @@ def update_order(order_id, new_items):
     order["total_amount"] = total_amount
 
     print(f"Order {order_id} updated successfully!")
-    save_all_data()
+    persist_order_change(order_id)
     return True
 
 
@@ -302,49 +990,74 @@ def cancel_order(order_id):
 
     order = orders[order_id]
 
-    if order["status"] in ["Served", "Completed"]:
+    if order["status"] in ["Served", "Completed", "Cancelled"]:
         print(f"Cannot cancel order with status: {order['status']}")
         return False
 
     order["status"] = "Cancelled"
+    index_order(order_id)
+
+    released = release_order_tables(order_id)
 
-    if order["table_number"]:
-        tables[order["table_number"]]["status"] = "Available"
-        tables[order["table_number"]]["order_id"] = None
+    # Give back exactly the stock lots the order took
+    inv.return_ingredients(order.get("ingredients", []), f"Order {order_id} cancelled")
+    order["ingredients"] = []
 
     print(f"Order {order_id} cancelled successfully!")
-    save_all_data()
+    persist_order_change(order_id, released)
     return True
 
 
 def assign_table(table_number, order_id):
+    return assign_table_group([table_number], order_id)
+
+
+def assign_table_group(table_numbers, order_id):
+    """
+    Seat an order at one or more tables, all or none
+
+    Args:
+        table_numbers: Tables to seat the order at; the first goes on the order
+        order_id: ID of the order
+
+    """
     global tables, orders
 
-    if table_number not in tables:
-        print(f"Table {table_number} does not exist")
-        return False
+    for table_number in table_numbers:
+        if table_number not in tables:
+            print(f"Table {table_number} does not exist")
+            return False
 
-    if tables[table_number]["status"] == "Occupied":
-        print(f"Table {table_number} is already occupied")
-        return False
+        if tables[table_number]["status"] == "Occupied":
+            print(f"Table {table_number} is already occupied")
+            return False
 
     if order_id not in orders:
         print(f"Order {order_id} not found")
         return False
 
-    tables[table_number]["status"] = "Occupied"
-    tables[table_number]["order_id"] = order_id
-    orders[order_id]["table_number"] = table_number
+    for table_number in table_numbers:
+        tables[table_number]["status"] = "Occupied"
+        tables[table_number]["order_id"] = order_id
+        mark_table_taken(table_number)
+    orders[order_id]["table_number"] = table_numbers[0]
+    table_groups[order_id] = list(table_numbers)
 
-    print(f"Table {table_number} assigned to order {order_id}")
+    if len(table_numbers) == 1:
+        print(f"Table {table_numbers[0]} assigned to order {order_id}")
+    else:
+        print(
+            f"Tables {', '.join(str(num) for num in table_numbers)} "
+            f"combined for order {order_id}"
+        )
     return True
 
 
 def get_order_status(order_id):
-    if order_id not in orders:
+    order = find_order(order_id)
+    if order is None:
         print(f"Order {order_id} not found")
-        return None
-    return orders[order_id]
+    return order
 
 
 def update_order_status(order_id, new_status):
@@ -360,16 +1073,24 @@ def update_order_status(order_id, new_status):
         print(f"Order {order_id} not found")
         return False
 
+    # Cancelling frees the order's tables, whichever menu it comes from
+    if new_status == "Cancelled":
+        return cancel_order(order_id)
+
+    # Its stock has been given back, so a cancelled order stays cancelled
+    if orders[order_id]["status"] == "Cancelled":
+        print(f"Cannot change the status of cancelled order {order_id}")
+        return False
+
     orders[order_id]["status"] = new_status
+    index_order(order_id)
 
+    released = []
     if new_status == "Completed":
-        table_number = orders[order_id]["table_number"]
-        if table_number:
-            tables[table_number]["status"] = "Available"
-            tables[table_number]["order_id"] = None
+        released = release_order_tables(order_id)
 
     print(f"Order {order_id} status updated to '{new_status}'")
-    save_all_data()
+    persist_order_change(order_id, released)
     return True
 
 
@@ -385,12 +1106,11 @@ def get_all_tables():
 
 
 def get_order_summary(order_id):
-    if order_id not in orders:
+    order = find_order(order_id)
+    if order is None:
         print(f"Order {order_id} not found")
         return None
 
-    order = orders[order_id]
-
     summary = f"""
 ═══════════════════════════════════
 ORDER SUMMARY
@@ -415,15 +1135,47 @@ ITEMS:
 
 
 def get_all_orders(filter_status=None):
+    """
+    Get all orders, or only those with one status
+
+    Filtering reads the status index, so it costs only as much as the
+    orders that have that status.
+    """
     if filter_status:
-        filtered = {}
-        for order_id, order in orders.items():
-            if order["status"] == filter_status:
-                filtered[order_id] = order
-        return filtered
+        return {
+            order_id: orders[order_id]
+            for order_id in status_index.get(filter_status, ())
+        }
     return orders
 
 
+def get_customer_orders(customer_id, page=1, page_size=10):
+    """
+    Get one page of a customer's orders, most recent first
+
+    Args:
+        customer_id: Customer whose orders to get
+        page: Page number, starting at 1
+        page_size: Orders per page
+
+    Returns:
+        Dictionary of order ID -> order for that page
+    """
+    history = customer_orders.get(customer_id, [])
+    end = max(len(history) - (page - 1) * page_size, 0)
+    start = max(end - page_size, 0)
+    page_orders = {}
+    for _, order_id in reversed(history[start:end]):
+        order = find_order(order_id)
+        if order is not None:
+            page_orders[order_id] = order
+    return page_orders
+
+
+def count_customer_orders(customer_id):
+    return len(customer_orders.get(customer_id, []))
+
+
 def display_all_tables():
     print("\nTABLE STATUS")
     print("=" * 50)
@@ -432,7 +1184,10 @@ def display_all_tables():
         order_info = (
             f" (Order #{table_info['order_id']})" if table_info["order_id"] else ""
         )
-        print(f"{status_icon} Table {table_num}: {table_info['status']}{order_info}")
+        print(
+            f"{status_icon} Table {table_num} (seats {table_info['capacity']}): "
+            f"{table_info['status']}{order_info}"
+        )
     print("=" * 50)
 
 
@@ -462,8 +1217,9 @@ def interactive_test():
         print("3. View All Tables")
         print("4. Update Order Status")
         print("5. Reload Data from CSV")
-        print("6. Exit")
-        print("\nAuto-save: ON (saves after every action)")
+        print("6. Compact Order Journal")
+        print("7. Exit")
+        print("\nAuto-save: ON (journals every action)")
 
         choice = input("\nEnter choice: ")
 
@@ -552,11 +1308,16 @@ def interactive_test():
             load_all_data()
 
         elif choice == "6":
+            if compact_order_journal():
+                print("Order journal compacted into CSV files")
+
+        elif choice == "7":
+            compact_order_journal()
             print("Goodbye!")
             break
 
         else:
-            print("Invalid choice! Please select 1-6.")
+            print("Invalid choice! Please select 1-7.")
 
 
 if __name__ == "__main__":
@@ -1,11 +1,81 @@
 import csv
+import json
 import os
 from datetime import datetime, timedelta
 from collections import Counter
 
+import storage
+import data_loader
+import billing_and_payment as billing
+import ordering_table_management as order_mgmt
+
 report_cache = {}
 
-def generate_sales_report(start_date, end_date, transactions_file='transactions.csv'):
+
+def sync_order_files():
+    """
+    Write order changes that so far only reached the order journal
+    
+    On the CSV backend orders are journaled and only compacted into
+    orders.csv/order_items.csv later, so order reports flush them first.
+    """
+    data_loader.require('orders')
+    if order_mgmt.dirty_orders or order_mgmt.deleted_orders or order_mgmt.dirty_tables:
+        order_mgmt.save_all_data()
+
+def read_archived_transactions(start_date, end_date, archive_dir=billing.TRANSACTION_ARCHIVE_DIR):
+    """
+    Read transactions between two dates from the day-partitioned archive
+    
+    Only the partition files for days in range are opened.
+    
+    Args:
+        start_date: Start date (YYYY-MM-DD)
+        end_date: End date (YYYY-MM-DD)
+        archive_dir: Directory with one CSV per day and a manifest
+    
+    Returns:
+        List of transaction rows, or None if there is no archive
+    """
+    manifest = os.path.join(archive_dir, billing.ARCHIVE_MANIFEST)
+    if not os.path.exists(manifest):
+        return None
+    
+    rows = []
+    with open(manifest, 'r') as file:
+        for entry in csv.DictReader(file):
+            if start_date <= entry['date'] <= end_date:
+                with open(os.path.join(archive_dir, entry['filename']), 'r') as partition:
+                    rows.extend(csv.DictReader(partition))
+    
+    return rows
+
+
+def read_archived_orders(archive_file='orders_archive.jsonl'):
+    """
+    Read orders moved out of orders.csv into the order archive
+    
+    Args:
+        archive_file: Path to the archive (one JSON order per line)
+    
+    Returns:
+        List of order dictionaries, each with its order_items
+    """
+    if not os.path.exists(archive_file):
+        return []
+    
+    archived = {}
+    with open(archive_file, 'r') as file:
+        for line in file:
+            if line.strip():
+                order = json.loads(line)
+                archived[order['order_id']] = order
+    
+    return list(archived.values())
+
+
+def generate_sales_report(start_date, end_date, transactions_file='transactions.csv',
+                          archive_dir=billing.TRANSACTION_ARCHIVE_DIR):
     """
     Generate sales report for a date range
     
@@ -13,11 +83,12 @@ def generate_sales_report(start_date, end_date, transactions_file='transactions.
         start_date: Start date (YYYY-MM-DD)
         end_date: End date (YYYY-MM-DD)
         transactions_file: Path to transactions CSV
+        archive_dir: Day-partitioned transaction archive (used with CSV storage)
     
     Returns:
         Dictionary with sales summary
     """
-    if not os.path.exists(transactions_file):
+    if not storage.exists(transactions_file):
         print(f"{transactions_file} not found")
         return None
     
@@ -37,26 +108,33 @@ def generate_sales_report(start_date, end_date, transactions_file='transactions.
     total_service_charge = 0
     
     try:
-        with open(transactions_file, 'r') as file:
-            reader = csv.DictReader(file)
+        start_day = start.strftime('%Y-%m-%d')
+        end_day = end.strftime('%Y-%m-%d')
+        
+        # SQLite answers the range from its timestamp index; with CSV storage
+        # the day partitions avoid reading the whole history
+        rows = None
+        if storage.backend == 'csv':
+            rows = read_archived_transactions(start_day, end_day, archive_dir)
+        if rows is None:
+            # Timestamps are 'YYYY-MM-DD HH:MM:SS', so a text range selects the days
+            rows = storage.query_rows(transactions_file, 'timestamp',
+                                      start_day, end_day + ' 23:59:59')
+        
+        for row in rows:
+            amount = float(row['total'])
+            total_sales += amount
+            total_transactions += 1
+            
+            payment_type = row['payment_type']
+            payment_breakdown[payment_type] = payment_breakdown.get(payment_type, 0) + amount
+            
+            date_str = row['timestamp'].split(' ')[0]
+            daily_sales[date_str] = daily_sales.get(date_str, 0) + amount
             
-            for row in reader:
-                trans_date = datetime.strptime(row['timestamp'].split(' ')[0], '%Y-%m-%d')
-                
-                if start <= trans_date <= end:
-                    amount = float(row['total'])
-                    total_sales += amount
-                    total_transactions += 1
-                    
-                    payment_type = row['payment_type']
-                    payment_breakdown[payment_type] = payment_breakdown.get(payment_type, 0) + amount
-                    
-                    date_str = trans_date.strftime('%Y-%m-%d')
-                    daily_sales[date_str] = daily_sales.get(date_str, 0) + amount
-                    
-                    total_discount += float(row['discount'])
-                    total_tax += float(row['tax'])
-                    total_service_charge += float(row['service_charge'])
+            total_discount += float(row['discount'])
+            total_tax += float(row['tax'])
+            total_service_charge += float(row['service_charge'])
         
         report = {
             'start_date': start_date,
@@ -78,32 +156,36 @@ def generate_sales_report(start_date, end_date, transactions_file='transactions.
         return None
 
 
-def get_best_selling_items(orders_file='orders.csv', order_items_file='order_items.csv', limit=10):
+def get_best_selling_items(orders_file='orders.csv', order_items_file='order_items.csv', limit=10,
+                           archive_file='orders_archive.jsonl'):
     """
-    Get best-selling menu items
+    Get best-selling menu items, including archived orders
     
     Args:
         orders_file: Path to orders CSV
         order_items_file: Path to order items CSV
         limit: Number of top items to return
+        archive_file: Path to the order archive
     
     Returns:
         List of tuples (item_name, quantity_sold)
     """
-    if not os.path.exists(order_items_file):
+    sync_order_files()
+    if not storage.exists(order_items_file):
         print(f"{order_items_file} not found")
         return []
     
     item_sales = Counter()
     
     try:
-        with open(order_items_file, 'r') as file:
-            reader = csv.DictReader(file)
-            
-            for row in reader:
-                item_name = row['item_name']
-                quantity = int(row['quantity'])
-                item_sales[item_name] += quantity
+        for row in storage.load_rows(order_items_file):
+            item_name = row['item_name']
+            quantity = int(row['quantity'])
+            item_sales[item_name] += quantity
+        
+        for order in read_archived_orders(archive_file):
+            for item in order['order_items']:
+                item_sales[item['item_name']] += item['quantity']
         
         # Get top items
         best_sellers = item_sales.most_common(limit)
@@ -115,18 +197,21 @@ def get_best_selling_items(orders_file='orders.csv', order_items_file='order_ite
 
 
 def get_least_ordered_items(orders_file='orders.csv', order_items_file='order_items.csv', 
-                            menu_file='menu_items.csv', limit=10):
+                            menu_file='menu_items.csv', limit=10,
+                            archive_file='orders_archive.jsonl'):
     """
-    Get least-ordered menu items
+    Get least-ordered menu items, including archived orders
     
     Args:
         orders_file: Path to orders CSV
         order_items_file: Path to order items CSV
         menu_file: Path to menu items CSV
         limit: Number of items to return
+        archive_file: Path to the order archive
     
     """
-    if not os.path.exists(order_items_file) or not os.path.exists(menu_file):
+    sync_order_files()
+    if not storage.exists(order_items_file) or not storage.exists(menu_file):
         print(f"Required files not found")
         return []
     
@@ -135,18 +220,18 @@ def get_least_ordered_items(orders_file='orders.csv', order_items_file='order_it
     
     try:
         # Get all menu items
-        with open(menu_file, 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                all_menu_items.add(row['item_name'])
+        for row in storage.load_rows(menu_file):
+            all_menu_items.add(row['item_name'])
         
         # Count sales
-        with open(order_items_file, 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                item_name = row['item_name']
-                quantity = int(row['quantity'])
-                item_sales[item_name] += quantity
+        for row in storage.load_rows(order_items_file):
+            item_name = row['item_name']
+            quantity = int(row['quantity'])
+            item_sales[item_name] += quantity
+        
+        for order in read_archived_orders(archive_file):
+            for item in order['order_items']:
+                item_sales[item['item_name']] += item['quantity']
         
         # Find items with 0 or low sales
         for item in all_menu_items:
@@ -172,7 +257,7 @@ def generate_inventory_summary(inventory_file='inventory.csv'):
     Returns:
         Dictionary with inventory summary
     """
-    if not os.path.exists(inventory_file):
+    if not storage.exists(inventory_file):
         print(f"{inventory_file} not found")
         return None
     
@@ -181,24 +266,21 @@ def generate_inventory_summary(inventory_file='inventory.csv'):
     out_of_stock_items = []
     
     try:
-        with open(inventory_file, 'r') as file:
-            reader = csv.DictReader(file)
+        for row in storage.load_rows(inventory_file):
+            total_items += 1
+            quantity = float(row['quantity'])
+            reorder_level = float(row['reorder_level'])
+            item_name = row['item_name']
             
-            for row in reader:
-                total_items += 1
-                quantity = float(row['quantity'])
-                reorder_level = float(row['reorder_level'])
-                item_name = row['item_name']
-                
-                if quantity == 0:
-                    out_of_stock_items.append(item_name)
-                elif quantity <= reorder_level:
-                    low_stock_items.append({
-                        'item_name': item_name,
-                        'quantity': quantity,
-                        'unit': row['unit'],
-                        'reorder_level': reorder_level
-                    })
+            if quantity == 0:
+                out_of_stock_items.append(item_name)
+            elif quantity <= reorder_level:
+                low_stock_items.append({
+                    'item_name': item_name,
+                    'quantity': quantity,
+                    'unit': row['unit'],
+                    'reorder_level': reorder_level
+                })
         
         summary = {
             'total_items': total_items,
@@ -225,7 +307,7 @@ def get_user_activity_summary(activity_file='user_activity.csv'):
     Returns:
         Dictionary with activity summary
     """
-    if not os.path.exists(activity_file):
+    if not storage.exists(activity_file):
         print(f"{activity_file} not found")
         return None
     
@@ -234,17 +316,14 @@ def get_user_activity_summary(activity_file='user_activity.csv'):
     recent_activities = []
     
     try:
-        with open(activity_file, 'r') as file:
-            reader = csv.DictReader(file)
-            
-            activities = list(reader)
-            total_activities = len(activities)
-            
-            for row in activities:
-                username = row['username']
-                user_actions[username] += 1
-            
-            recent_activities = activities[-20:]
+        activities = storage.load_rows(activity_file)
+        total_activities = len(activities)
+        
+        for row in activities:
+            username = row['username']
+            user_actions[username] += 1
+        
+        recent_activities = activities[-20:]
         
         summary = {
             'total_activities': total_activities,
@@ -260,14 +339,16 @@ def get_user_activity_summary(activity_file='user_activity.csv'):
         return None
 
 
-def get_table_utilization(orders_file='orders.csv'):
+def get_table_utilization(orders_file='orders.csv', archive_file='orders_archive.jsonl'):
     """
-    Get table utilization statistics
+    Get table utilization statistics, including archived orders
     
     Args:
         orders_file: Path to orders CSV
+        archive_file: Path to the order archive
     """
-    if not os.path.exists(orders_file):
+    sync_order_files()
+    if not storage.exists(orders_file):
         print(f"{orders_file} not found")
         return None
     
@@ -275,14 +356,16 @@ def get_table_utilization(orders_file='orders.csv'):
     total_dine_in = 0
     
     try:
-        with open(orders_file, 'r') as file:
-            reader = csv.DictReader(file)
-            
-            for row in reader:
-                if row['order_type'] == 'Dine In' and row['table_number']:
-                    table_num = row['table_number']
-                    table_usage[table_num] += 1
-                    total_dine_in += 1
+        for row in storage.load_rows(orders_file):
+            if row['order_type'] == 'Dine In' and row['table_number']:
+                table_num = row['table_number']
+                table_usage[table_num] += 1
+                total_dine_in += 1
+        
+        for order in read_archived_orders(archive_file):
+            if order['order_type'] == 'Dine In' and order['table_number']:
+                table_usage[str(order['table_number'])] += 1
+                total_dine_in += 1
         
         stats = {
             'total_dine_in_orders': total_dine_in,
@@ -305,7 +388,7 @@ def generate_revenue_breakdown(transactions_file='transactions.csv'):
         transactions_file: Path to transactions CSV
     
     """
-    if not os.path.exists(transactions_file):
+    if not storage.exists(transactions_file):
         print(f"{transactions_file} not found")
         return None
     
@@ -315,14 +398,11 @@ def generate_revenue_breakdown(transactions_file='transactions.csv'):
     total_discount = 0
     
     try:
-        with open(transactions_file, 'r') as file:
-            reader = csv.DictReader(file)
-            
-            for row in reader:
-                total_subtotal += float(row['subtotal'])
-                total_service += float(row['service_charge'])
-                total_tax += float(row['tax'])
-                total_discount += float(row['discount'])
+        for row in storage.load_rows(transactions_file):
+            total_subtotal += float(row['subtotal'])
+            total_service += float(row['service_charge'])
+            total_tax += float(row['tax'])
+            total_discount += float(row['discount'])
         
         breakdown = {
             'subtotal': round(total_subtotal, 2),
@@ -0,0 +1,444 @@
+"""
+Storage backends for the Restaurant Management System
+Rows are kept either in CSV files (default) or in one SQLite database
+"""
+
+import csv
+import io
+import os
+import sqlite3
+import threading
+import time
+from itertools import islice
+
+BACKENDS = ["csv", "sqlite"]
+
+backend = "csv"
+database_file = "restaurant.db"
+connection = None
+db_lock = threading.Lock()
+
+# filename -> {key: formatted CSV text of that key's rows}
+row_cache = {}
+
+# filename -> {"saves", "rows", "bytes", "seconds"} accumulated by save_rows()
+save_stats = {}
+
+# Column used for point updates in each table
+TABLE_KEYS = {
+    "users": "username",
+    "menu_items": "item_id",
+    "inventory": "item_id",
+    "tables": "table_number",
+    "orders": "order_id",
+    "order_items": "order_id",
+    "order_ingredients": "order_id",
+    "transactions": "transaction_id",
+    "recipes": "menu_item_id",
+    "inventory_lots": "item_id",
+}
+
+# Tables where one key owns several rows
+GROUPED_TABLES = ["order_items", "order_ingredients", "recipes", "inventory_lots"]
+
+# Secondary indexes used for lookups and range queries
+TABLE_INDEXES = {
+    "orders": ["status", "customer_id"],
+    "transactions": ["timestamp"],
+    "user_activity": ["timestamp"],
+    "inventory_usage": ["timestamp"],
+}
+
+
+def set_backend(name, db_file="restaurant.db"):
+    """
+    Select where all modules read and write their rows
+
+    Args:
+        name: 'csv' or 'sqlite'
+        db_file: SQLite database file (sqlite backend only)
+
+    """
+    global backend, database_file, connection
+
+    if name not in BACKENDS:
+        print(f"Invalid storage backend. Must be: {', '.join(BACKENDS)}")
+        return False
+
+    if connection is not None:
+        connection.close()
+        connection = None
+
+    backend = name
+    database_file = db_file
+
+    if name == "sqlite":
+        connection = sqlite3.connect(db_file, check_same_thread=False)
+
+    print(f"Storage backend: {name}")
+    return True
+
+
+def table_name(filename):
+    """Name of the SQLite table that mirrors a CSV file"""
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def source_file(filename):
+    """File that actually holds the rows for filename"""
+    if backend == "sqlite":
+        return database_file
+    return filename
+
+
+def _text(value):
+    return "" if value is None else str(value)
+
+
+def _table_exists(table):
+    cursor = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    )
+    return cursor.fetchone() is not None
+
+
+def _create_table(table, fieldnames):
+    columns = ", ".join(f'"{name}" TEXT' for name in fieldnames)
+    connection.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({columns})')
+
+    key = TABLE_KEYS.get(table)
+    if key:
+        unique = "" if table in GROUPED_TABLES else "UNIQUE "
+        connection.execute(
+            f'CREATE {unique}INDEX IF NOT EXISTS "idx_{table}_{key}" '
+            f'ON "{table}" ("{key}")'
+        )
+
+    for column in TABLE_INDEXES.get(table, []):
+        connection.execute(
+            f'CREATE INDEX IF NOT EXISTS "idx_{table}_{column}" '
+            f'ON "{table}" ("{column}")'
+        )
+
+
+def _insert_rows(table, fieldnames, rows, replace=False):
+    columns = ", ".join(f'"{name}"' for name in fieldnames)
+    placeholders = ", ".join("?" for _ in fieldnames)
+    verb = "INSERT OR REPLACE" if replace else "INSERT"
+    connection.executemany(
+        f'{verb} INTO "{table}" ({columns}) VALUES ({placeholders})',
+        ([_text(value) for value in row] for row in rows),
+    )
+
+
+def _upsert_rows(table, fieldnames, rows):
+    key = TABLE_KEYS[table]
+    columns = ", ".join(f'"{name}"' for name in fieldnames)
+    placeholders = ", ".join("?" for _ in fieldnames)
+    updates = ", ".join(
+        f'"{name}" = excluded."{name}"' for name in fieldnames if name != key
+    )
+    # ON CONFLICT keeps the original rowid, so rows stay in insertion order
+    connection.executemany(
+        f'INSERT INTO "{table}" ({columns}) VALUES ({placeholders}) '
+        f'ON CONFLICT("{key}") DO UPDATE SET {updates}',
+        ([_text(value) for value in row] for row in rows),
+    )
+
+
+def _import_csv(filename, table):
+    """Copy an existing CSV file into a new SQLite table"""
+    with open(filename, "r", newline="") as file:
+        reader = csv.reader(file)
+        fieldnames = next(reader, None)
+        if not fieldnames:
+            return False
+
+        _create_table(table, fieldnames)
+        _insert_rows(table, fieldnames, reader, replace=True)
+
+    print(f"Imported {filename} into {database_file}")
+    return True
+
+
+def exists(filename):
+    """Check whether a table has been saved before"""
+    if backend == "sqlite":
+        with db_lock:
+            return _table_exists(table_name(filename)) or os.path.exists(filename)
+    return os.path.exists(filename)
+
+
+def load_rows(filename):
+    """
+    Read every row of a table
+
+    Returns:
+        List of dictionaries (column -> text), or None if the table does not exist
+    """
+    if backend == "sqlite":
+        table = table_name(filename)
+        with db_lock, connection:
+            if not _table_exists(table):
+                if not os.path.exists(filename) or not _import_csv(filename, table):
+                    return None
+
+            cursor = connection.execute(f'SELECT * FROM "{table}" ORDER BY rowid')
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor]
+
+    if not os.path.exists(filename):
+        return None
+
+    # Reloaded rows replace whatever was formatted from the old ones
+    row_cache.pop(filename, None)
+
+    with open(filename, "r") as file:
+        return list(csv.DictReader(file))
+
+
+def save_rows(filename, fieldnames, keys, make_rows, changed=None, deleted=None):
+    """
+    Write a keyed table
+
+    Args:
+        filename: CSV file name (also names the SQLite table)
+        fieldnames: Column names
+        keys: Every record key (or the dict itself), in storage order
+        make_rows: Function returning the list of rows for one key
+        changed: Keys added or modified since the last save
+        deleted: Keys removed since the last save
+
+    When neither changed nor deleted is given every row is rewritten.
+    Otherwise the SQLite backend only touches those keys, and the CSV
+    backend rewrites the file but re-formats only the changed rows,
+    reusing the cached text of the others.
+    """
+    start_time = time.perf_counter()
+
+    if backend == "sqlite":
+        rows_written, bytes_written = _save_sqlite(
+            filename, fieldnames, keys, make_rows, changed, deleted
+        )
+    else:
+        rows_written, bytes_written = _save_csv(
+            filename, fieldnames, keys, make_rows, changed, deleted
+        )
+
+    stats = save_stats.setdefault(
+        filename, {"saves": 0, "rows": 0, "bytes": 0, "seconds": 0.0}
+    )
+    stats["saves"] += 1
+    stats["rows"] += rows_written
+    stats["bytes"] += bytes_written
+    stats["seconds"] += time.perf_counter() - start_time
+    return True
+
+
+def _save_sqlite(filename, fieldnames, keys, make_rows, changed, deleted):
+    table = table_name(filename)
+    key_column = TABLE_KEYS[table]
+
+    with db_lock, connection:
+        _create_table(table, fieldnames)
+
+        if changed is None and deleted is None:
+            connection.execute(f'DELETE FROM "{table}"')
+            rows = [row for key in keys for row in make_rows(key)]
+            _insert_rows(table, fieldnames, rows)
+        else:
+            changed = list(changed or [])
+            removed = list(deleted or [])
+            if table in GROUPED_TABLES:
+                removed += changed
+
+            connection.executemany(
+                f'DELETE FROM "{table}" WHERE "{key_column}" = ?',
+                [(_text(key),) for key in removed],
+            )
+
+            rows = [row for key in changed for row in make_rows(key)]
+            if table in GROUPED_TABLES:
+                _insert_rows(table, fieldnames, rows)
+            else:
+                _upsert_rows(table, fieldnames, rows)
+
+    return len(rows), sum(len(_text(value)) for row in rows for value in row)
+
+
+def _save_csv(filename, fieldnames, keys, make_rows, changed, deleted):
+    if changed is None and deleted is None:
+        row_cache.pop(filename, None)
+        changed = ()
+
+    cache = row_cache.setdefault(filename, {})
+    changed = set(changed or ())
+    for key in deleted or ():
+        cache.pop(key, None)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fieldnames)
+    parts = [buffer.getvalue()]
+    rows_written = 0
+
+    for key in keys:
+        text = cache.get(key)
+        if text is None or key in changed:
+            buffer.seek(0)
+            buffer.truncate()
+            rows = make_rows(key)
+            writer.writerows(rows)
+            text = buffer.getvalue()
+            cache[key] = text
+            rows_written += len(rows)
+        parts.append(text)
+
+    with open(filename, "w", newline="") as file:
+        file.write("".join(parts))
+
+    return rows_written, os.path.getsize(filename)
+
+
+def display_save_stats():
+    """Display rows, bytes and time spent per save for each table"""
+    print("\nSTORAGE SAVE STATS")
+    print("=" * 80)
+    print(
+        f"{'Table':<22} {'Saves':<8} {'Rows/Save':<12} {'Bytes/Save':<14} {'ms/Save':<10}"
+    )
+    print("=" * 80)
+
+    if not save_stats:
+        print("Nothing saved yet.")
+    else:
+        for filename, stats in save_stats.items():
+            saves = stats["saves"]
+            print(
+                f"{table_name(filename):<22} {saves:<8} "
+                f"{stats['rows'] / saves:<12.1f} {stats['bytes'] / saves:<14,.0f} "
+                f"{stats['seconds'] * 1000 / saves:<10.3f}"
+            )
+
+    print("=" * 80)
+
+
+def append_rows(filename, fieldnames, rows):
+    """Append rows to a log table without rewriting it"""
+    rows = list(rows)
+
+    if backend == "sqlite":
+        table = table_name(filename)
+        with db_lock, connection:
+            if not _table_exists(table) and os.path.exists(filename):
+                _import_csv(filename, table)
+            _create_table(table, fieldnames)
+            _insert_rows(table, fieldnames, rows)
+        return True
+
+    is_new = not os.path.exists(filename) or os.path.getsize(filename) == 0
+
+    with open(filename, "a", newline="") as file:
+        writer = csv.writer(file)
+        if is_new:
+            writer.writerow(fieldnames)
+        writer.writerows(rows)
+    return True
+
+
+def read_rows_backwards(filename, batch_size=500):
+    """
+    Yield the rows of a log table newest first, reading only as far as asked
+
+    The CSV backend reads the file backwards in blocks from the end;
+    SQLite reads batches of rowids downwards.
+    """
+    if backend == "sqlite":
+        table = table_name(filename)
+        with db_lock, connection:
+            if not _table_exists(table):
+                if not os.path.exists(filename) or not _import_csv(filename, table):
+                    return
+
+        # The lock is only held per batch, not while the caller works
+        before = None
+        while True:
+            with db_lock:
+                if before is None:
+                    cursor = connection.execute(
+                        f'SELECT rowid, * FROM "{table}" ORDER BY rowid DESC LIMIT ?',
+                        (batch_size,),
+                    )
+                else:
+                    cursor = connection.execute(
+                        f'SELECT rowid, * FROM "{table}" WHERE rowid < ? '
+                        f"ORDER BY rowid DESC LIMIT ?",
+                        (before, batch_size),
+                    )
+                columns = [description[0] for description in cursor.description]
+                batch = cursor.fetchall()
+            if not batch:
+                return
+            for row in batch:
+                yield dict(zip(columns[1:], row[1:]))
+            before = batch[-1][0]
+
+    if not os.path.exists(filename):
+        return
+
+    with open(filename, "rb") as file:
+        header = file.readline()
+        header_end = file.tell()
+        fieldnames = next(csv.reader([header.decode("utf-8", "replace")]), [])
+
+        file.seek(0, os.SEEK_END)
+        position = file.tell()
+        partial = b""
+        while position > header_end:
+            step = min(8192, position - header_end)
+            position -= step
+            file.seek(position)
+            lines = (file.read(step) + partial).split(b"\n")
+            # The first line may continue in the block before this one
+            partial = lines.pop(0)
+            for line in reversed(lines):
+                row = next(csv.reader([line.decode("utf-8", "replace")]), None)
+                if row:
+                    yield dict(zip(fieldnames, row))
+
+        row = next(csv.reader([partial.decode("utf-8", "replace")]), None)
+        if row:
+            yield dict(zip(fieldnames, row))
+
+
+def tail_rows(filename, limit):
+    """Read the last limit rows of a log table without reading all of it"""
+    if limit <= 0:
+        return []
+    return list(islice(read_rows_backwards(filename), limit))[::-1]
+
+
+def query_rows(filename, column, low, high):
+    """
+    Read rows whose column value lies between low and high (inclusive)
+
+    Values are compared as text, which orders 'YYYY-MM-DD HH:MM:SS'
+    timestamps correctly. SQLite answers this from an index.
+    """
+    if backend == "sqlite":
+        table = table_name(filename)
+        with db_lock, connection:
+            if not _table_exists(table):
+                if not os.path.exists(filename) or not _import_csv(filename, table):
+                    return []
+
+            cursor = connection.execute(
+                f'SELECT * FROM "{table}" WHERE "{column}" BETWEEN ? AND ? '
+                f'ORDER BY "{column}", rowid',
+                (low, high),
+            )
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor]
+
+    rows = load_rows(filename) or []
+    return [row for row in rows if low <= row[column] <= high]
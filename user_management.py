@@ -1,35 +1,37 @@
-import csv
-import os
 from datetime import datetime
 
+import storage
+
 # Global variables
 users = {}
 current_user = None
 user_activity_log = []
+activity_log_saved = 0  # entries of user_activity_log already in storage
+dirty_users = set()  # usernames changed since the last save
 
 VALID_ROLES = ["Admin", "Cashier", "Waiter", "Customer"]
 
 
 def save_users_to_csv(filename="users.csv"):
-    """Save all users to CSV file"""
+    """Save users, writing only the ones changed since the last save"""
     try:
-        with open(filename, "w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(
-                ["username", "password", "role", "name", "contact", "status"]
-            )
-
-            for username, user_info in users.items():
-                writer.writerow(
-                    [
-                        username,
-                        user_info["password"],
-                        user_info["role"],
-                        user_info["name"],
-                        user_info["contact"],
-                        user_info["status"],
-                    ]
-                )
+        storage.save_rows(
+            filename,
+            ["username", "password", "role", "name", "contact", "status"],
+            users,
+            lambda username: [
+                [
+                    username,
+                    users[username]["password"],
+                    users[username]["role"],
+                    users[username]["name"],
+                    users[username]["contact"],
+                    users[username]["status"],
+                ]
+            ],
+            dirty_users,
+        )
+        dirty_users.clear()
         return True
     except Exception as e:
         print(f"Error saving users: {e}")
@@ -40,7 +42,7 @@ def load_users_from_csv(filename="users.csv"):
     """Load users from CSV file"""
     global users
 
-    if not os.path.exists(filename):
+    if not storage.exists(filename):
         print(f"{filename} not found. Creating default admin account.")
         # Create default admin
         users["admin"] = {
@@ -51,23 +53,23 @@ def load_users_from_csv(filename="users.csv"):
             "contact": "N/A",
             "status": "Active",
         }
+        dirty_users.add("admin")
         save_users_to_csv()
         return False
 
     try:
-        with open(filename, "r") as file:
-            reader = csv.DictReader(file)
-            users = {}
-
-            for row in reader:
-                users[row["username"]] = {
-                    "username": row["username"],
-                    "password": row["password"],
-                    "role": row["role"],
-                    "name": row["name"],
-                    "contact": row["contact"],
-                    "status": row["status"],
-                }
+        users = {}
+        dirty_users.clear()
+
+        for row in storage.load_rows(filename):
+            users[row["username"]] = {
+                "username": row["username"],
+                "password": row["password"],
+                "role": row["role"],
+                "name": row["name"],
+                "contact": row["contact"],
+                "status": row["status"],
+            }
 
         print(f"Loaded {len(users)} users from {filename}")
         return True
@@ -77,14 +79,19 @@ def load_users_from_csv(filename="users.csv"):
 
 
 def save_activity_log_to_csv(filename="user_activity.csv"):
-    """Save user activity log to CSV"""
-    try:
-        with open(filename, "w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(["timestamp", "username", "action"])
+    """Append activity entries that have not been saved yet"""
+    global activity_log_saved
 
-            for log in user_activity_log:
-                writer.writerow([log["timestamp"], log["username"], log["action"]])
+    try:
+        storage.append_rows(
+            filename,
+            ["timestamp", "username", "action"],
+            [
+                [log["timestamp"], log["username"], log["action"]]
+                for log in user_activity_log[activity_log_saved:]
+            ],
+        )
+        activity_log_saved = len(user_activity_log)
         return True
     except Exception as e:
         print(f"Error saving activity log: {e}")
@@ -93,25 +100,24 @@ def save_activity_log_to_csv(filename="user_activity.csv"):
 
 def load_activity_log_from_csv(filename="user_activity.csv"):
     """Load activity log from CSV"""
-    global user_activity_log
+    global user_activity_log, activity_log_saved
 
-    if not os.path.exists(filename):
+    if not storage.exists(filename):
         return False
 
     try:
-        with open(filename, "r") as file:
-            reader = csv.DictReader(file)
-            user_activity_log = []
-
-            for row in reader:
-                user_activity_log.append(
-                    {
-                        "timestamp": row["timestamp"],
-                        "username": row["username"],
-                        "action": row["action"],
-                    }
-                )
+        user_activity_log = []
+
+        for row in storage.load_rows(filename):
+            user_activity_log.append(
+                {
+                    "timestamp": row["timestamp"],
+                    "username": row["username"],
+                    "action": row["action"],
+                }
+            )
 
+        activity_log_saved = len(user_activity_log)
         return True
     except Exception as e:
         print(f"Error loading activity log: {e}")
@@ -152,6 +158,7 @@ def register_user(username, password, role, name, contact):
     }
 
     log_activity(username, f"User registered as {role}")
+    dirty_users.add(username)
     save_users_to_csv()
     save_activity_log_to_csv()
 
@@ -259,6 +266,7 @@ def update_profile(username, new_data):
         user["password"] = new_data["password"]
 
     log_activity(current_user or "system", f"Updated profile for {username}")
+    dirty_users.add(username)
     save_users_to_csv()
     save_activity_log_to_csv()
 
@@ -298,6 +306,7 @@ def change_user_status(username, status):
     users[username]["status"] = status
 
     log_activity(current_user, f"Changed {username} status to {status}")
+    dirty_users.add(username)
     save_users_to_csv()
     save_activity_log_to_csv()
 
@@ -334,6 +343,7 @@ def change_user_role(username, new_role):
     users[username]["role"] = new_role
 
     log_activity(current_user, f"Changed {username} role from {old_role} to {new_role}")
+    dirty_users.add(username)
     save_users_to_csv()
     save_activity_log_to_csv()
 